@@ -0,0 +1,278 @@
+import gzip
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, request
+
+from models import db, Venue, Artist, Show
+from cache import cached_venue_data, cached_artist_data
+from facets import parse_filters
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+# Columns a client may select with ?fields=, named as in venue_data() and
+# artist_data() so responses keep the shape of the HTML views.
+VENUE_FIELDS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'genres': Venue.genres,
+    'address': Venue.address,
+    'city': Venue.city,
+    'state': Venue.state,
+    'phone': Venue.phone,
+    'website': Venue.website_link,
+    'facebook_link': Venue.facebook_link,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'image_link': Venue.image_link,
+    'upcoming_shows_count': Venue.upcoming_shows_count,
+    'past_shows_count': Venue.past_shows_count,
+}
+
+ARTIST_FIELDS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'genres': Artist.genres,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'website': Artist.website_link,
+    'facebook_link': Artist.facebook_link,
+    'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description,
+    'image_link': Artist.image_link,
+    'upcoming_shows_count': Artist.upcoming_shows_count,
+    'past_shows_count': Artist.past_shows_count,
+}
+
+
+SEARCH_FIELDS = ['id', 'name', 'num_upcoming_shows']
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+    return api_response({"error": error.message}, error.status)
+
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def api_response(payload, status=200):
+    body = json.dumps(payload, default=json_default, separators=(',', ':'))
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if status != 200:
+        return response
+
+    # weak, as the same ETag is served for the identity and gzip encodings
+    response.add_etag(weak=True)
+    response.make_conditional(request)
+    if (response.status_code == 200
+            and 'gzip' in request.headers.get('Accept-Encoding', '')
+            and len(body) >= current_app.config['API_GZIP_MIN_SIZE']):
+        response.set_data(gzip.compress(response.get_data(), 6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def requested_fields(allowed):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(allowed)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def select_fields(data, fields):
+    return {field: data[field] for field in fields}
+
+
+def per_page():
+    value = request.args.get(
+        'per_page', current_app.config['API_PER_PAGE'], type=int)
+    return max(1, min(value, current_app.config['API_MAX_PER_PAGE']))
+
+
+def list_entities(model, columns):
+    # keyset pagination on id over only the selected columns
+    fields = requested_fields(columns)
+    limit = per_page()
+    query = db.session.query(
+        model.id.label('cursor'), *[columns[field].label(field) for field in fields])
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(model.id > after)
+    rows = query.order_by(model.id).limit(limit + 1).all()
+
+    return api_response({
+        "data": [{field: getattr(row, field) for field in fields}
+                 for row in rows[:limit]],
+        "next": rows[limit - 1].cursor if len(rows) > limit else None,
+    })
+
+
+def entity_detail(data):
+    if not data:
+        raise ApiError('not found', 404)
+    return api_response(select_fields(data, requested_fields(data)))
+
+
+def autocomplete_entities(model):
+    # prefix matches from the in-memory index, for the pickers of the forms
+    config = current_app.config
+    limit = request.args.get('limit', config['AUTOCOMPLETE_LIMIT'], type=int)
+    limit = max(1, min(limit, config['AUTOCOMPLETE_MAX_LIMIT']))
+    return api_response({"data": current_app.extensions['autocomplete'].complete(
+        model, request.args.get('q', ''), limit)})
+
+
+def browse_entities(model):
+    try:
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        raise ApiError(str(e))
+    results = current_app.extensions['facets'].browse(
+        model, filters, 'all' if request.args.get('match') == 'all' else 'any',
+        after=request.args.get('after', type=int), limit=per_page())
+    results['facets'] = {facet: [{"value": value, "count": count}
+                                 for value, count in counts]
+                         for facet, counts in results['facets'].items()}
+    return api_response(results)
+
+
+def search_entities(model):
+    results = model.search(
+        request.args.get('q', ''), limit=per_page(),
+        with_total=request.args.get('total') in ('1', 'true'))
+    fields = requested_fields(SEARCH_FIELDS)
+    return api_response({
+        "count": results['count'],
+        "data": [select_fields(data, fields) for data in results['data']],
+    })
+
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+
+@api.route('/venues')
+def list_venues():
+    return list_entities(Venue, VENUE_FIELDS)
+
+
+@api.route('/venues/search')
+def search_venues():
+    return search_entities(Venue)
+
+
+@api.route('/venues/browse')
+def browse_venues():
+    return browse_entities(Venue)
+
+
+@api.route('/venues/autocomplete')
+def autocomplete_venues():
+    return autocomplete_entities(Venue)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue_detail(venue_id):
+    # served from the same cache entry as the HTML page
+    return entity_detail(cached_venue_data(
+        current_app.extensions['cache'], venue_id))
+
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+
+@api.route('/artists')
+def list_artists():
+    return list_entities(Artist, ARTIST_FIELDS)
+
+
+@api.route('/artists/search')
+def search_artists():
+    return search_entities(Artist)
+
+
+@api.route('/artists/browse')
+def browse_artists():
+    return browse_entities(Artist)
+
+
+@api.route('/artists/autocomplete')
+def autocomplete_artists():
+    return autocomplete_entities(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist_detail(artist_id):
+    return entity_detail(cached_artist_data(
+        current_app.extensions['cache'], artist_id))
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+
+SHOW_FIELDS = ['id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+               'artist_image_link', 'start_time']
+
+
+@api.route('/shows')
+def list_shows():
+    fields = requested_fields(SHOW_FIELDS)
+    try:
+        page = Show.get_page(after=request.args.get('after'),
+                             before=request.args.get('before'),
+                             per_page=per_page())
+    except ValueError as e:
+        raise ApiError(str(e))
+    return api_response({
+        "data": [select_fields(show, fields) for show in page['shows']],
+        "next": page['next_cursor'],
+        "prev": page['prev_cursor'],
+    })
+
+
+@api.route('/shows/search')
+def search_shows():
+    # shows whose venue or artist name matches, soonest first
+    fields = requested_fields(SHOW_FIELDS)
+    pattern = f"%{request.args.get('q', '')}%"
+    rows = Show.listing_query().filter(db.or_(
+        Venue.name.ilike(pattern), Artist.name.ilike(pattern)
+    )).order_by(Show.start_time, Show.id).limit(per_page()).all()
+    data = [select_fields(Show.listing_data(row), fields) for row in rows]
+    return api_response({"count": len(data), "data": data})
+
+
+@api.route('/shows/<int:show_id>')
+def show_detail(show_id):
+    row = Show.listing_query().filter(Show.id == show_id).first()
+    return entity_detail(Show.listing_data(row) if row else None)
@@ -3,8 +3,10 @@
 #----------------------------------------------------------------------------#
 
 import json
+from functools import lru_cache
 import dateutil.parser
 import babel
+import babel.dates
 from flask import Flask, abort, jsonify, render_template, request, Response, flash, redirect, url_for
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
@@ -15,6 +17,22 @@ from flask_wtf import Form, CSRFProtect
 from forms import *
 from flask_migrate import Migrate
 from models import *
+from search import init_search
+from autocomplete import init_autocomplete
+from facets import init_facets
+from cache import (init_cache, cached_venue_data, cached_artist_data,
+                   invalidate_venue, invalidate_artist, invalidate_show)
+from fragments import init_fragments
+from httpcache import init_http_cache, check_etag, not_modified
+from schedule import init_schedule
+from recommendations import init_recommendations, recommended_artists, recommended_venues
+from bookings import lock_bookings, find_conflicts, conflict_message
+from api import api
+from counters import init_counters
+from importer import init_importer
+from exporter import init_exporter
+from instrumentation import init_instrumentation
+from metrics import init_metrics
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -24,6 +42,20 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db = db_init(app)
+init_search(app)
+init_autocomplete(app)
+init_facets(app)
+cache = init_cache(app)
+init_fragments(app)
+init_http_cache(app)
+app.register_blueprint(api)
+init_counters(app)
+init_importer(app)
+init_exporter(app)
+init_schedule(app)
+init_recommendations(app)
+init_instrumentation(app)
+init_metrics(app)
 csrf = CSRFProtect(app)
 
 
@@ -32,13 +64,27 @@ csrf = CSRFProtect(app)
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    return (babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+            babel.Locale.parse(locale))
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    pattern, locale = datetime_pattern(format, locale)
+    if value.tzinfo is None:
+        # babel.dates.format_datetime reads naive datetimes as UTC
+        value = value.replace(tzinfo=babel.dates.UTC)
+    return pattern.apply(value, locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -59,48 +105,37 @@ def index():
 
 @app.route('/venues')
 def venues():
-    # print()
-    distict_areas = Venue.query.options(load_only('city', 'state')).distinct(
-        Venue.city, Venue.state).all()
-    all_venues = Venue.query.all()
-
-    data = []
-    for area in distict_areas:
-        venues = []
-        for venue in all_venues:
-            if venue.state == area.state and venue.city == area.city:
-                venues.append({
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": 5
-                })
-        data.append({
-            "city": area.city,
-            "state": area.state,
-            "venues": venues
-        })
+    data = Venue.get_areas()
+    if check_etag('venues', data):
+        return not_modified()
 
     return render_template('pages/venues.html', areas=data)
 
 
 @ app.route('/venues/search', methods=['POST'])
 def search_venues():
-    q = request.form.get('search_term')
-    result = Venue.query.filter(Venue.name.ilike(f'%{q}%')).all()
-    response = {
-        "count": len(result),
-        "data": [venue.search_result() for venue in result]
-    }
+    q = request.form.get('search_term', '')
+    response = Venue.search(q, limit=app.config['SEARCH_RESULTS_LIMIT'],
+                            with_total=app.config['SEARCH_WITH_TOTAL'])
 
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 @ app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
-    if not venue:
+    version = Venue.version(venue_id)
+    if version is None:
         abort(404)
-    return render_template('pages/show_venue.html', venue=venue.venue_data())
+    recommendations = recommended_artists(
+        venue_id, app.config.get('RECOMMENDATIONS_SHOWN', 6))
+    if check_etag('venue', venue_id, *version,
+                  [(row['id'], row['score']) for row in recommendations]):
+        return not_modified()
+    data = cached_venue_data(cache, venue_id, version)
+    if not data:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=data,
+                           recommendations=recommendations)
 
 
 #  Create Venue
@@ -137,6 +172,7 @@ def create_venue_submission():
         new_venue = Venue(**data)
         db.session.add(new_venue)
         db.session.commit()
+        invalidate_venue(cache, new_venue.id)
         flash('Venue ' + request.form['name'] +
               ' was successfully listed!')
     except Exception as e:
@@ -160,6 +196,7 @@ def delete_venue(venue_id):
             return redirect(url_for('index'))
 
         try:
+            invalidate_venue(cache, venue.id)
             db.session.delete(venue)
             db.session.commit()
             flash(f'Venue : {venue.name} is successfuly deleted !!')
@@ -179,27 +216,35 @@ def delete_venue(venue_id):
 
 @ app.route('/artists')
 def artists():
-    data = Artist.query.all()
+    data = db.session.query(Artist.id, Artist.name).order_by(Artist.id).all()
+    if check_etag('artists', data):
+        return not_modified()
     return render_template('pages/artists.html', artists=data)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    q = request.form.get('search_term')
-    result = Artist.query.filter(Artist.name.ilike(f'%{q}%')).all()
-    response = {
-        "count": len(result),
-        "data": [artist.search_result() for artist in result]
-    }
+    q = request.form.get('search_term', '')
+    response = Artist.search(q, limit=app.config['SEARCH_RESULTS_LIMIT'],
+                             with_total=app.config['SEARCH_WITH_TOTAL'])
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
-    if not artist:
+    version = Artist.version(artist_id)
+    if version is None:
+        abort(404)
+    recommendations = recommended_venues(
+        artist_id, app.config.get('RECOMMENDATIONS_SHOWN', 6))
+    if check_etag('artist', artist_id, *version,
+                  [(row['id'], row['score']) for row in recommendations]):
+        return not_modified()
+    data = cached_artist_data(cache, artist_id, version)
+    if not data:
         abort(404)
-    return render_template('pages/show_artist.html', artist=artist.artist_data())
+    return render_template('pages/show_artist.html', artist=data,
+                           recommendations=recommendations)
 
 
 #  Update
@@ -208,7 +253,7 @@ def show_artist(artist_id):
 
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    artist = Artist.get_with_shows(artist_id)
     if not artist:
         abort(404)
     form = ArtistForm(data=artist.artist_data())
@@ -236,6 +281,7 @@ def edit_artist_submission(artist_id):
         artist.seeking_venue = form.data.get('seeking_venue')
         artist.seeking_description = form.data.get('seeking_description')
         db.session.commit()
+        invalidate_artist(cache, artist_id)
         flash('Artest ' + request.form['name'] +
               ' was successfully listed!')
     except Exception as e:
@@ -251,7 +297,7 @@ def edit_artist_submission(artist_id):
 
 @ app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    venue = Venue.get_with_shows(venue_id)
     if not venue:
         abort(404)
 
@@ -281,6 +327,7 @@ def edit_venue_submission(venue_id):
         venue.seeking_talent = form.data.get('seeking_talent')
         venue.seeking_description = form.data.get('seeking_description')
         db.session.commit()
+        invalidate_venue(cache, venue_id)
         flash('Venue ' + request.form['name'] +
               ' was successfully listed!')
     except Exception as e:
@@ -344,9 +391,21 @@ def create_artist_submission():
 
 @ app.route('/shows')
 def shows():
-    shows = Show.query.all()
-    data = [show.show_data() for show in shows]
-    return render_template('pages/shows.html', shows=data)
+    per_page = request.args.get(
+        'per_page', app.config['SHOWS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, app.config['SHOWS_MAX_PER_PAGE']))
+    try:
+        page = Show.get_page(after=request.args.get('after'),
+                             before=request.args.get('before'),
+                             per_page=per_page)
+    except ValueError:
+        abort(400)
+    if check_etag('shows', per_page, page):
+        return not_modified()
+    return render_template('pages/shows.html', shows=page['shows'],
+                           next_cursor=page['next_cursor'],
+                           prev_cursor=page['prev_cursor'],
+                           per_page=per_page)
 
 
 @ app.route('/shows/create')
@@ -365,12 +424,21 @@ def create_show_submission():
     try:
         data = {
             'start_time': form.data.get('start_time'),
-            'venue_id': form.data.get('venue_id'),
-            'artist_id': form.data.get('artist_id')
+            'duration_minutes': form.data.get('duration_minutes') or SHOW_DEFAULT_MINUTES,
+            'venue_id': int(form.data.get('venue_id')),
+            'artist_id': int(form.data.get('artist_id'))
         }
+        lock_bookings(data['venue_id'], data['artist_id'])
+        conflicts = find_conflicts(**data)
+        if conflicts:
+            db.session.rollback()
+            for conflict in conflicts:
+                flash(conflict_message(conflict))
+            return redirect(url_for('create_shows'))
         new_show = Show(**data)
         db.session.add(new_show)
         db.session.commit()
+        invalidate_show(cache, data['venue_id'], data['artist_id'])
         flash('Show was successfully listed!')
     except Exception as e:
         print(e)
@@ -383,6 +451,11 @@ def create_show_submission():
     return redirect(url_for('index'))
 
 
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({**cache.stats(), 'fragments': app.extensions['fragments'].stats()})
+
+
 @ app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,347 @@
+"""ASGI entry point: read-only pages on asyncpg, everything else on Flask.
+
+    uvicorn asgi:app --workers 4
+
+The venue, artist and show listings, detail pages and searches are served
+by coroutines querying Postgres through an asyncpg pool, so a worker keeps
+serving other requests while a query is in flight. Every other URL (forms,
+edits, deletes, the JSON API, exports) is passed to the Flask app through
+WSGIMiddleware. Pages are still rendered by Flask's templates inside a
+Flask request context, pushed only around synchronous code: Flask's context
+locals are per thread, so no await may happen while one is pushed.
+"""
+from types import SimpleNamespace
+
+import asyncpg
+from flask import render_template, request as flask_request, session
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware, build_environ
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import HTTPException
+
+from app import app as flask_app, cache
+from cache import venue_key, artist_key
+from models import Venue, Artist, Show, decode_cursor, split_shows
+
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+
+AREAS = """
+    SELECT city, state, id, name, upcoming_shows_count FROM venue
+    ORDER BY state, city, id
+"""
+ARTISTS = 'SELECT id, name FROM artist ORDER BY id'
+
+VENUE = 'SELECT * FROM venue WHERE id = $1'
+VENUE_SHOWS = """
+    SELECT show.artist_id, artist.name AS artist_name,
+           artist.image_link AS artist_image_link, show.start_time
+    FROM show JOIN artist ON artist.id = show.artist_id
+    WHERE show.venue_id = $1
+    ORDER BY show.start_time, show.id
+"""
+ARTIST = 'SELECT * FROM artist WHERE id = $1'
+ARTIST_SHOWS = """
+    SELECT artist.id AS artist_id, artist.name AS artist_name,
+           artist.image_link AS artist_image_link, show.venue_id,
+           venue.name AS venue_name, venue.image_link AS venue_image_link,
+           show.start_time
+    FROM show JOIN venue ON venue.id = show.venue_id
+    JOIN artist ON artist.id = show.artist_id
+    WHERE show.artist_id = $1
+    ORDER BY show.start_time, show.id
+"""
+
+SHOWS = """
+    SELECT show.id, show.start_time, show.venue_id, venue.name AS venue_name,
+           show.artist_id, artist.name AS artist_name,
+           artist.image_link AS artist_image_link
+    FROM show JOIN venue ON show.venue_id = venue.id
+    JOIN artist ON show.artist_id = artist.id
+"""
+
+# recommendations.recommended_artists and recommended_venues
+RECOMMENDED_ARTISTS = """
+    SELECT artist.id, artist.name, artist.image_link, artist.city, artist.state,
+           recommendation.score
+    FROM recommendation JOIN artist ON artist.id = recommendation.artist_id
+    WHERE recommendation.kind = 'artist' AND recommendation.venue_id = $1
+    ORDER BY recommendation.score DESC, artist.id LIMIT $2
+"""
+RECOMMENDED_VENUES = """
+    SELECT venue.id, venue.name, venue.image_link, venue.city, venue.state,
+           recommendation.score
+    FROM recommendation JOIN venue ON venue.id = recommendation.venue_id
+    WHERE recommendation.kind = 'venue' AND recommendation.artist_id = $1
+    ORDER BY recommendation.score DESC, venue.id LIMIT $2
+"""
+
+# the same match and ranking as search.TrigramSearch
+SEARCH_FIELDS = ('name', 'city', 'state', 'fyyur_genres_text(genres)')
+SEARCH_MATCH = ' OR '.join(
+    [f'{field} % $1' for field in SEARCH_FIELDS]
+    + [f'{field} ILIKE $2' for field in SEARCH_FIELDS])
+SEARCH_SCORE = 'greatest({})'.format(
+    ', '.join(f'similarity({field}, $1)' for field in SEARCH_FIELDS))
+
+
+async def get_areas(connection):
+    return Venue.build_areas(await connection.fetch(AREAS))
+
+
+async def get_artists(connection):
+    return [dict(row) for row in await connection.fetch(ARTISTS)]
+
+
+async def get_venue_data(connection, venue_id):
+    venue = await connection.fetchrow(VENUE, venue_id)
+    if venue is None:
+        return None
+    shows = await connection.fetch(VENUE_SHOWS, venue_id)
+    return Venue.detail_data(SimpleNamespace(**venue),
+                             *split_shows(dict(show) for show in shows))
+
+
+async def get_artist_data(connection, artist_id):
+    artist = await connection.fetchrow(ARTIST, artist_id)
+    if artist is None:
+        return None
+    shows = await connection.fetch(ARTIST_SHOWS, artist_id)
+    return Artist.detail_data(SimpleNamespace(**artist),
+                              *split_shows(dict(show) for show in shows))
+
+
+async def get_recommendations(connection, query, entity_id):
+    limit = flask_app.config.get('RECOMMENDATIONS_SHOWN', 6)
+    return [dict(row) for row in await connection.fetch(query, entity_id, limit)]
+
+
+async def get_show_page(connection, after=None, before=None, per_page=30):
+    # keyset pagination on (start_time, id), as Show.get_page
+    if before:
+        query = SHOWS + """
+            WHERE (show.start_time, show.id) < ($1, $2)
+            ORDER BY show.start_time DESC, show.id DESC LIMIT $3"""
+        args = (*decode_cursor(before), per_page + 1)
+    elif after:
+        query = SHOWS + """
+            WHERE (show.start_time, show.id) > ($1, $2)
+            ORDER BY show.start_time, show.id LIMIT $3"""
+        args = (*decode_cursor(after), per_page + 1)
+    else:
+        query = SHOWS + ' ORDER BY show.start_time, show.id LIMIT $1'
+        args = (per_page + 1,)
+    rows = [SimpleNamespace(**row) for row in await connection.fetch(query, *args)]
+    return Show.page_data(rows, after, before, per_page)
+
+
+async def search(connection, table, term, limit, with_total):
+    args = (term, f'%{term}%')
+    rows = await connection.fetch(
+        f'SELECT id, name, upcoming_shows_count, {SEARCH_SCORE} AS score '
+        f'FROM {table} WHERE {SEARCH_MATCH} '
+        f'ORDER BY score DESC, name, id LIMIT $3', *args, limit)
+    data = [{
+        "id": row['id'],
+        "name": row['name'],
+        "num_upcoming_shows": row['upcoming_shows_count'],
+    } for row in rows]
+    if with_total:
+        count = await connection.fetchval(
+            f'SELECT count(*) FROM {table} WHERE {SEARCH_MATCH}', *args)
+    else:
+        count = len(data)
+    return {"count": count, "data": data}
+
+
+async def cached(key, loader):
+    # cache.get_or_set for a coroutine loader; None is never cached
+    value = cache.get(key)
+    if value is None:
+        cache.misses += 1
+        value = await loader()
+        if value is not None:
+            cache.set(key, value)
+    else:
+        cache.hits += 1
+    return value
+
+
+#----------------------------------------------------------------------------#
+# Rendering through Flask.
+#----------------------------------------------------------------------------#
+
+
+async def flask_environ(request):
+    return build_environ(request.scope, await request.body())
+
+
+def render(environ, template, status=200, **context):
+    # the session is saved as a Flask response would, for the CSRF token of
+    # the search forms and for flashed messages the page consumed
+    with flask_app.request_context(environ):
+        response = flask_app.make_response(
+            (render_template(template, **context), status))
+        flask_app.session_interface.save_session(flask_app, session, response)
+    return to_starlette(response)
+
+
+def to_starlette(response):
+    converted = Response(response.get_data(), status_code=response.status_code)
+    converted.raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                             for name, value in response.headers]
+    return converted
+
+
+def search_term(environ):
+    """The submitted term, once the CSRF token checks out (CSRFProtect would
+    have checked it before the Flask view)."""
+    with flask_app.request_context(environ):
+        if flask_app.config.get('WTF_CSRF_ENABLED', True):
+            flask_app.extensions['csrf'].protect()
+        return flask_request.form.get('search_term', '')
+
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+
+async def venues(request):
+    async with pool().acquire() as connection:
+        areas = await get_areas(connection)
+    return render(await flask_environ(request), 'pages/venues.html', areas=areas)
+
+
+async def artists(request):
+    async with pool().acquire() as connection:
+        data = await get_artists(connection)
+    return render(await flask_environ(request), 'pages/artists.html', artists=data)
+
+
+async def show_venue(request):
+    venue_id = request.path_params['venue_id']
+
+    async def load():
+        async with pool().acquire() as connection:
+            return await get_venue_data(connection, venue_id)
+
+    data = await cached(venue_key(venue_id), load)
+    environ = await flask_environ(request)
+    if not data:
+        return render(environ, 'errors/404.html', 404)
+    async with pool().acquire() as connection:
+        recommendations = await get_recommendations(connection, RECOMMENDED_ARTISTS, venue_id)
+    return render(environ, 'pages/show_venue.html', venue=data,
+                  recommendations=recommendations)
+
+
+async def show_artist(request):
+    artist_id = request.path_params['artist_id']
+
+    async def load():
+        async with pool().acquire() as connection:
+            return await get_artist_data(connection, artist_id)
+
+    data = await cached(artist_key(artist_id), load)
+    environ = await flask_environ(request)
+    if not data:
+        return render(environ, 'errors/404.html', 404)
+    async with pool().acquire() as connection:
+        recommendations = await get_recommendations(connection, RECOMMENDED_VENUES, artist_id)
+    return render(environ, 'pages/show_artist.html', artist=data,
+                  recommendations=recommendations)
+
+
+async def shows(request):
+    config = flask_app.config
+    try:
+        per_page = int(request.query_params.get('per_page', config['SHOWS_PER_PAGE']))
+    except ValueError:
+        per_page = config['SHOWS_PER_PAGE']
+    per_page = max(1, min(per_page, config['SHOWS_MAX_PER_PAGE']))
+    try:
+        async with pool().acquire() as connection:
+            page = await get_show_page(connection,
+                                       after=request.query_params.get('after'),
+                                       before=request.query_params.get('before'),
+                                       per_page=per_page)
+    except ValueError:
+        return Response('Bad Request', status_code=400)
+    return render(await flask_environ(request), 'pages/shows.html',
+                  shows=page['shows'], next_cursor=page['next_cursor'],
+                  prev_cursor=page['prev_cursor'], per_page=per_page)
+
+
+def search_view(table, template):
+    async def view(request):
+        environ = await flask_environ(request)
+        try:
+            term = search_term(environ)
+        except HTTPException as e:
+            return to_starlette(e.get_response())
+        async with pool().acquire() as connection:
+            results = await search(connection, table, term,
+                                   flask_app.config['SEARCH_RESULTS_LIMIT'],
+                                   flask_app.config['SEARCH_WITH_TOTAL'])
+        return render(environ, template, results=results, search_term=term)
+    return view
+
+
+#----------------------------------------------------------------------------#
+# Application.
+#----------------------------------------------------------------------------#
+
+
+def pool_options(config):
+    options = {
+        'min_size': config.get('ASYNC_POOL_MIN_SIZE', 2),
+        'max_size': config.get('ASYNC_POOL_MAX_SIZE', 10),
+        'max_inactive_connection_lifetime': config.get('DB_POOL_RECYCLE', 1800),
+    }
+    if config.get('DB_PGBOUNCER'):
+        # asyncpg prepares every statement; transaction pooling cannot
+        # keep prepared statements, so turn its statement cache off
+        options['statement_cache_size'] = 0
+    elif config.get('DB_STATEMENT_TIMEOUT'):
+        options['server_settings'] = {
+            'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}
+    return options
+
+
+def pool():
+    return app.state.pool
+
+
+async def connect():
+    config = flask_app.config
+    dsn = config.get('ASYNC_DATABASE_URL') or config['SQLALCHEMY_DATABASE_URI']
+    app.state.pool = await asyncpg.create_pool(dsn, **pool_options(config))
+
+
+async def disconnect():
+    await app.state.pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/venues', venues),
+        Route('/venues/search', search_view('venue', 'pages/search_venues.html'),
+              methods=['POST']),
+        Route('/venues/{venue_id:int}', show_venue),
+        Route('/artists', artists),
+        Route('/artists/search', search_view('artist', 'pages/search_artists.html'),
+              methods=['POST']),
+        Route('/artists/{artist_id:int}', show_artist),
+        Route('/shows', shows),
+        # a Route that matches the path but not the method (POST
+        # /venues/<id> deletes) also falls through to Flask
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    on_startup=[connect],
+    on_shutdown=[disconnect],
+)
@@ -0,0 +1,146 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from functools import partial
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist, after_commit
+
+
+#----------------------------------------------------------------------------#
+# Name autocomplete.
+#
+# Each model's names are kept folded (lower case, no accents) in sorted
+# lists, one of the names and one with an entry for every later word of a
+# name, so the names with a word starting with the typed prefix are two
+# contiguous slices found by bisect, each read only up to the limit.
+# ORM events apply this process's creates, edits and deletes once they
+# commit; writes from other processes (workers, `flask import`) show up
+# when the index is rebuilt, every AUTOCOMPLETE_REFRESH_SECONDS.
+#----------------------------------------------------------------------------#
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class PrefixIndex:
+    """Sorted (folded name, id) entries, and sorted (word suffix, id)
+    entries for the later words of the names."""
+
+    def __init__(self):
+        self.names = []
+        self.words = []
+        self.items = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    @staticmethod
+    def keys(name):
+        words = fold(name).split()
+        return ' '.join(words), [' '.join(words[i:]) for i in range(1, len(words))]
+
+    def add(self, entity_id, name, **extra):
+        self.remove(entity_id)
+        self.items[entity_id] = dict(extra, id=entity_id, name=name)
+        whole, suffixes = self.keys(name)
+        insort(self.names, (whole, entity_id))
+        for key in suffixes:
+            insort(self.words, (key, entity_id))
+
+    @staticmethod
+    def discard(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def remove(self, entity_id):
+        item = self.items.pop(entity_id, None)
+        if item is None:
+            return
+        whole, suffixes = self.keys(item['name'])
+        self.discard(self.names, (whole, entity_id))
+        for key in suffixes:
+            self.discard(self.words, (key, entity_id))
+
+    def complete(self, prefix, limit=10):
+        """Up to `limit` items with a word starting with `prefix`: names
+        starting with it in name order, then names with a later word
+        starting with it, in the order of that word."""
+        prefix = ' '.join(fold(prefix).split())
+        if not prefix:
+            return []
+        found, seen = [], set()
+        # each scan stops at `limit` matches, or at the end of its slice
+        for entries in (self.names, self.words):
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(found) < limit:
+                key, entity_id = entries[i]
+                if not key.startswith(prefix):
+                    break
+                if entity_id not in seen:
+                    seen.add(entity_id)
+                    found.append(self.items[entity_id])
+                i += 1
+        return found
+
+
+class Autocomplete:
+
+    def __init__(self, refresh_seconds=300):
+        self.refresh_seconds = refresh_seconds
+        self.indexes = {}
+        self.built_at = {}
+        self.lock = threading.Lock()
+        for model in (Venue, Artist):
+            event.listen(model, 'after_insert', self.on_write)
+            event.listen(model, 'after_update', self.on_write)
+            event.listen(model, 'after_delete', self.on_delete)
+
+    def build(self, model):
+        index = PrefixIndex()
+        rows = db.session.query(model.id, model.name, model.city, model.state)
+        for entity_id, name, city, state in rows:
+            index.add(entity_id, name, city=city, state=state)
+        return index
+
+    def index(self, model):
+        now = time.monotonic()
+        if (model not in self.indexes
+                or now - self.built_at[model] >= self.refresh_seconds):
+            # claimed first, so concurrent requests keep using the old index
+            self.built_at[model] = now
+            index = self.build(model)
+            with self.lock:
+                self.indexes[model] = index
+        return self.indexes[model]
+
+    def on_write(self, mapper, connection, target):
+        after_commit(target, partial(
+            self.apply, mapper.class_, 'add', target.id, target.name,
+            city=target.city, state=target.state))
+
+    def on_delete(self, mapper, connection, target):
+        after_commit(target, partial(
+            self.apply, mapper.class_, 'remove', target.id))
+
+    def apply(self, model, method, *args, **kwargs):
+        index = self.indexes.get(model)
+        if index is not None:
+            with self.lock:
+                getattr(index, method)(*args, **kwargs)
+
+    def complete(self, model, prefix, limit=10):
+        index = self.index(model)
+        with self.lock:
+            return index.complete(prefix, limit)
+
+
+def init_autocomplete(app):
+    autocomplete = Autocomplete(app.config.get('AUTOCOMPLETE_REFRESH_SECONDS', 300))
+    app.extensions['autocomplete'] = autocomplete
+    return autocomplete
@@ -0,0 +1,159 @@
+"""Concurrent throughput of the read-only pages under WSGI and ASGI.
+
+Starts the Flask app on a threaded WSGI server and asgi.py on uvicorn, one
+process each, then loads the pages asgi.py serves natively (listings,
+details, shows pages and searches) from --concurrency client threads. The
+detail cache is on in both modes. Postgres only; unless --no-seed, the
+catalog is replaced, so use a disposable database.
+
+    python -m benchmarks.asgi --database-url postgresql://.../fyyur_bench \\
+        --shows 100000 --concurrency 64 --json asgi.json
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import seed as seeding
+from benchmarks.routes import all_routes
+from benchmarks.suite import NoRedirect, send, summarize
+
+ROUTES = ('venues', 'artists', 'shows', 'shows_page', 'show_venue',
+          'show_artist', 'search_venues', 'search_artists')
+
+WSGI_SERVER = """
+import logging
+import sys
+from werkzeug.serving import make_server
+from app import app
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+make_server('127.0.0.1', int(sys.argv[1]), app, threaded=True).serve_forever()
+"""
+
+
+def server_command(mode, port):
+    if mode == 'wsgi':
+        return [sys.executable, '-c', WSGI_SERVER, str(port)]
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            urllib.request.urlopen(base_url + '/').read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'{base_url} did not come up')
+
+
+def csrf_headers(base_url):
+    # the search forms are CSRF protected in both modes: take the session
+    # cookie and token a browser would get from any page
+    with urllib.request.urlopen(base_url + '/venues') as response:
+        cookie = response.headers['Set-Cookie'].split(';')[0]
+        token = re.search(rb'name="csrf_token" value="([^"]+)"',
+                          response.read()).group(1).decode()
+    return {'Cookie': cookie}, token
+
+
+def load(base_url, routes, requests, concurrency):
+    headers, token = csrf_headers(base_url)
+    results = {}
+    with ThreadPoolExecutor(concurrency) as pool:
+        for route in routes:
+            calls = []
+            for i in range(requests):
+                method, url, data = route(i)
+                if data is not None:
+                    data = dict(data, csrf_token=token)
+                calls.append((method, url, data))
+            # warm the detail cache and the connection pools
+            list(pool.map(lambda call: send(base_url, *call, headers),
+                          calls[:concurrency]))
+            started = time.perf_counter()
+            outcomes = list(pool.map(
+                lambda call: send(base_url, *call, headers), calls))
+            elapsed = time.perf_counter() - started
+            results[route.name] = dict(
+                summarize([latency for latency, _ in outcomes]),
+                throughput_rps=requests / elapsed,
+                errors=sum(status >= 400 for _, status in outcomes),
+            )
+    return results
+
+
+def run(mode, database_url, routes, requests, concurrency):
+    port = free_port()
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_URL=database_url,
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark'))
+    process = subprocess.Popen(server_command(mode, port), env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url, process)
+        return load(base_url, routes, requests, concurrency)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--no-seed', action='store_true',
+                        help='benchmark the data already in the database')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per page and mode')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    import config
+    from app import app
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(args.database_url)
+    with app.app_context():
+        if not args.no_seed:
+            seeding.seed(args.venues, args.artists, args.shows,
+                         args.days, args.seed)
+        routes = [route for route in all_routes() if route.name in ROUTES]
+
+    urllib.request.install_opener(urllib.request.build_opener(NoRedirect))
+    report = {mode: run(mode, args.database_url, routes, args.requests,
+                        args.concurrency)
+              for mode in ('wsgi', 'asgi')}
+
+    print(f"{'page':>15} {'wsgi rps':>10} {'asgi rps':>10} {'change':>8} "
+          f"{'wsgi p99':>10} {'asgi p99':>10} {'errors':>7}")
+    for name in report['wsgi']:
+        wsgi, asgi = report['wsgi'][name], report['asgi'][name]
+        change = (asgi['throughput_rps'] / wsgi['throughput_rps'] - 1) * 100
+        print(f"{name:>15} {wsgi['throughput_rps']:10.1f} "
+              f"{asgi['throughput_rps']:10.1f} {change:+7.1f}% "
+              f"{wsgi['p99_ms']:10.2f} {asgi['p99_ms']:10.2f} "
+              f"{wsgi['errors'] + asgi['errors']:7d}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Per-call cost of the `datetime` Jinja filter.
+
+Compares the original filter (str() timestamps reparsed by dateutil, Babel
+pattern rebuilt on every call) with app.format_datetime, which takes the
+datetime objects the models now pass through, caches the compiled pattern
+per (format, locale) and memoizes its output.
+
+    python -m benchmarks.datetime_filter [--shows 5000] [--repeat 5]
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import format_datetime, datetime_pattern
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=5000,
+                        help='start times rendered per simulated page')
+    parser.add_argument('--distinct', type=int, default=500,
+                        help='distinct start times among them')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    base = datetime(2021, 1, 1, 20, 0)
+    start_times = [base + timedelta(hours=i % args.distinct)
+                   for i in range(args.shows)]
+    as_strings = [str(start_time) for start_time in start_times]
+
+    def legacy():
+        for value in as_strings:
+            legacy_format_datetime(value, 'full')
+
+    def cold():
+        format_datetime.cache_clear()
+        datetime_pattern.cache_clear()
+        for value in start_times:
+            format_datetime(value, 'full')
+
+    def warm():
+        for value in start_times:
+            format_datetime(value, 'full')
+
+    assert legacy_format_datetime(as_strings[0], 'full') == \
+        format_datetime(start_times[0], 'full')
+
+    warm()
+    for name, fn in (('legacy', legacy), ('cold cache', cold), ('warm cache', warm)):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f'{name:>12}: {best * 1e6 / args.shows:8.2f} us/call '
+              f'({best * 1e3:.1f} ms per {args.shows} calls)')
+
+
+if __name__ == '__main__':
+    main()
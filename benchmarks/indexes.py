@@ -0,0 +1,159 @@
+"""Query plans and latencies of every view with and without the show indexes.
+
+Seeds the database (unless --no-seed), then for each phase drops or
+creates the indexes of migration 82cc1f4a846b (the show access paths and
+the venue listing order; the other indexes are left alone), drives every GET/search view through the Flask test client and runs
+EXPLAIN (ANALYZE, FORMAT JSON) on the SELECTs each view issued. Postgres
+only; point it at a disposable database, as the catalog is replaced.
+
+    python -m benchmarks.indexes --database-url postgresql://.../fyyur_bench \\
+        --venues 10000 --artists 20000 --shows 500000 --json indexes.json
+"""
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy import event
+
+from benchmarks import seed as seeding
+from benchmarks.routes import all_routes
+
+
+def plan_nodes(plan):
+    node = plan['Node Type']
+    if 'Index Name' in plan:
+        node += f" using {plan['Index Name']}"
+    if 'Relation Name' in plan:
+        node += f" on {plan['Relation Name']}"
+    yield node
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(engine, statement, parameters):
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement, parameters)
+        result = cursor.fetchone()[0][0]
+        raw.rollback()
+    finally:
+        raw.close()
+    return {
+        'statement': ' '.join(statement.split())[:200],
+        'execution_ms': result['Execution Time'],
+        'nodes': list(plan_nodes(result['Plan'])),
+    }
+
+
+# created by migration 82cc1f4a846b
+INDEXES = ('ix_show_venue_id_start_time', 'ix_show_artist_id_start_time',
+           'ix_show_start_time_id', 'ix_venue_state_city')
+
+
+def set_indexes(db, present):
+    tables = set()
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in INDEXES:
+                    continue
+                connection.execute(f'DROP INDEX IF EXISTS {index.name}')
+                if present:
+                    index.create(connection)
+                tables.add(table.name)
+        for table in sorted(tables):
+            connection.execute(f'ANALYZE {table}')
+
+
+def measure(app, db, client, targets, requests):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    results = {}
+    for route in targets:
+        method, url, data = route(0)
+        latencies = []
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            for _ in range(requests):
+                # the detail cache would hide the queries being measured
+                app.extensions['cache'].clear()
+                statements.clear()
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, (url, response.status_code)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        results[route.name] = {
+            'url': url,
+            'median_ms': statistics.median(latencies),
+            'max_ms': max(latencies),
+            'queries': len(statements),
+            'plans': [explain(db.engine, statement, parameters)
+                      for statement, parameters in statements
+                      if statement.lstrip().upper().startswith('SELECT')],
+        }
+    return results
+
+
+def print_report(report):
+    for phase, results in report.items():
+        print(f'== {phase}')
+        for name, result in results.items():
+            print(f"{name:>15}: {result['median_ms']:9.2f} ms median "
+                  f"{result['max_ms']:9.2f} ms max  {result['queries']} queries")
+            for plan in result['plans']:
+                print(f"{'':>17}{plan['execution_ms']:9.2f} ms  "
+                      f"{' > '.join(plan['nodes'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--database-url',
+                        help='overrides SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='benchmark the data already in the database')
+    parser.add_argument('--requests', type=int, default=5,
+                        help='requests per view and phase')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    import config
+    from app import app, db
+    if args.database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(
+            args.database_url)
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+
+    report = {}
+    with app.app_context():
+        if not args.no_seed:
+            seeding.seed(args.venues, args.artists, args.shows,
+                         args.days, args.seed)
+        targets = [route for route in all_routes() if route.readonly]
+
+        for phase, present in (('without_indexes', False), ('with_indexes', True)):
+            # the views share this context's session; end its transaction
+            # so DROP/CREATE INDEX is not blocked behind it
+            db.session.remove()
+            set_indexes(db, present)
+            report[phase] = measure(app, db, client, targets, args.requests)
+        db.session.remove()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Date-range queries of schedule.py against filtering every show in Python.
+
+Seeds the database (unless --no-seed), then for each case (a weekend, a
+month, a month of the busiest venue, artist and city, and a year of the
+busiest venue) times
+  full_scan: the shows loaded the way the pages did before /calendar
+             (the whole listing, or get_with_shows for one venue or artist)
+             and filtered on start_time in Python;
+  range:     schedule.shows_between plus schedule.day_counts.
+Both must find the same shows. Point --database-url at a disposable
+database, as the catalog is replaced.
+
+    python -m benchmarks.ranges --database-url postgresql://.../fyyur_bench \\
+        --shows 500000 --json ranges.json
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks import seed as seeding
+
+
+def timed(function, repeat):
+    latencies, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies), result
+
+
+def cases(db, Venue, Artist, Show):
+    venue_id = db.session.query(Venue.id).order_by(
+        (Venue.upcoming_shows_count + Venue.past_shows_count).desc()).limit(1).scalar()
+    artist_id = db.session.query(Artist.id).order_by(
+        (Artist.upcoming_shows_count + Artist.past_shows_count).desc()).limit(1).scalar()
+    city, = db.session.query(Venue.city).filter(Venue.id == venue_id).one()
+    today = date.today()
+    saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+    month = date(today.year, today.month, 1)
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return [
+        ('weekend', saturday, saturday + timedelta(days=2), {}),
+        ('month', month, next_month, {}),
+        ('venue_month', month, next_month, {'venue_id': venue_id}),
+        ('artist_month', month, next_month, {'artist_id': artist_id}),
+        ('city_month', month, next_month, {'city': city}),
+        ('venue_year', today, today + timedelta(days=365), {'venue_id': venue_id}),
+    ]
+
+
+def full_scan(db, Venue, Artist, Show, start, end, filters):
+    start = datetime.combine(start, datetime.min.time())
+    end = datetime.combine(end, datetime.min.time())
+    if 'venue_id' in filters or 'artist_id' in filters:
+        model = Venue if 'venue_id' in filters else Artist
+        entity = model.get_with_shows(filters.get('venue_id') or filters['artist_id'])
+        shows = [show.id for show in entity.shows if start <= show.start_time < end]
+    else:
+        rows = Show.listing_query().add_columns(Venue.city).order_by(
+            Show.start_time, Show.id).all()
+        shows = [row.id for row in rows if start <= row.start_time < end
+                 and filters.get('city') in (None, row.city)]
+    db.session.rollback()
+    return sorted(shows)
+
+
+def indexed(db, start, end, filters):
+    from schedule import shows_between, day_counts
+    shows = shows_between(start, end, **filters)
+    counts = day_counts(start, end, **filters)
+    assert sum(counts.values()) == len(shows)
+    db.session.rollback()
+    return sorted(show['id'] for show in shows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--database-url',
+                        help='overrides SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='benchmark the data already in the database')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per case and approach')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    import config
+    from app import app
+    from models import db, Venue, Artist, Show
+    if args.database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(
+            args.database_url)
+
+    report = {}
+    with app.app_context():
+        if not args.no_seed:
+            seeding.seed(args.venues, args.artists, args.shows,
+                         args.days, args.seed)
+        for name, start, end, filters in cases(db, Venue, Artist, Show):
+            scan_ms, expected = timed(lambda: full_scan(
+                db, Venue, Artist, Show, start, end, filters), args.repeat)
+            range_ms, found = timed(lambda: indexed(db, start, end, filters),
+                                    args.repeat)
+            assert found == expected, name
+            report[name] = {
+                'start': start.isoformat(), 'end': end.isoformat(),
+                'filters': filters, 'shows': len(found),
+                'full_scan_ms': scan_ms, 'range_ms': range_ms,
+            }
+        db.session.remove()
+
+    for name, result in report.items():
+        print(f"{name:>13}: {result['shows']:7} shows  full scan "
+              f"{result['full_scan_ms']:9.2f} ms  range {result['range_ms']:8.2f} ms "
+              f"({result['full_scan_ms'] / max(result['range_ms'], 1e-6):.1f}x)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Requests that exercise every route of app.py against a seeded catalog."""
+from datetime import datetime, timedelta
+from itertools import count
+from urllib.parse import urlencode
+
+from models import db, Venue, Artist, Show, encode_cursor
+
+
+class Route:
+    """A named route and the request to send on its i-th call."""
+
+    def __init__(self, name, request, readonly=True):
+        self.name = name
+        self.request = request
+        self.readonly = readonly
+
+    def __call__(self, i):
+        return self.request(i)
+
+
+def sample_ids():
+    # the busiest venue and artist, and a cursor in the middle of /shows
+    venue_id = db.session.query(Venue.id).order_by(
+        (Venue.upcoming_shows_count + Venue.past_shows_count).desc()).limit(1).scalar()
+    artist_id = db.session.query(Artist.id).order_by(
+        (Artist.upcoming_shows_count + Artist.past_shows_count).desc()).limit(1).scalar()
+    middle = db.session.query(Show.start_time, Show.id).order_by(
+        Show.start_time, Show.id).offset(Show.query.count() // 2).limit(1).first()
+    return venue_id, artist_id, encode_cursor(*middle)
+
+
+def throwaway_venues(number):
+    # venues for delete_venue to remove, so the seeded catalog stays intact
+    db.session.execute(Venue.__table__.insert(), [{
+        'name': f'Throwaway {i}', 'city': 'Throwaway', 'state': 'CA',
+        'address': '-', 'phone': '-', 'genres': ['Other'],
+    } for i in range(number)])
+    db.session.commit()
+    return iter([venue_id for venue_id, in db.session.query(Venue.id).filter(
+        Venue.city == 'Throwaway').order_by(Venue.id)])
+
+
+def venue_form(i):
+    return {'name': f'Bench Venue {i}', 'city': 'San Francisco',
+            'state': 'CA', 'address': f'{i} Bench St', 'phone': '555-0100',
+            'genres': ['Jazz', 'Blues'], 'seeking_talent': 'y',
+            'seeking_description': 'benchmark'}
+
+
+def artist_form(i):
+    return {'name': f'Bench Artist {i}', 'city': 'San Francisco',
+            'state': 'CA', 'phone': '555-0101', 'genres': ['Rock n Roll'],
+            'seeking_venue': 'y', 'seeking_description': 'benchmark'}
+
+
+def all_routes(deletable=0, search_term='blue'):
+    venue_id, artist_id, show_cursor = sample_ids()
+    # browse filters matching the busiest venue, by state when it has no genre
+    state, genres = db.session.query(Venue.state, Venue.genres).filter(
+        Venue.id == venue_id).one()
+    venue_filter = urlencode({'state': state})
+    artist_filter = urlencode({'genre': genres[0]} if genres else {'state': state})
+    deletions = throwaway_venues(deletable) if deletable else iter(())
+    show_times = count()
+
+    def show_form(i):
+        # three hours apart, after the seeded shows, so none is a double booking
+        start_time = datetime.today() + timedelta(days=2 * 365,
+                                                  hours=3 * next(show_times))
+        return {'venue_id': str(venue_id), 'artist_id': str(artist_id),
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')}
+
+    def get(url):
+        return lambda i: ('GET', url, None)
+
+    return [
+        Route('index', get('/')),
+        Route('venues', get('/venues')),
+        Route('search_venues', lambda i: (
+            'POST', '/venues/search', {'search_term': search_term})),
+        Route('show_venue', get(f'/venues/{venue_id}')),
+        Route('create_venue_form', get('/venues/create')),
+        Route('edit_venue', get(f'/venues/{venue_id}/edit')),
+        Route('artists', get('/artists')),
+        Route('search_artists', lambda i: (
+            'POST', '/artists/search', {'search_term': search_term})),
+        Route('show_artist', get(f'/artists/{artist_id}')),
+        Route('create_artist_form', get('/artists/create')),
+        Route('edit_artist', get(f'/artists/{artist_id}/edit')),
+        Route('shows', get('/shows')),
+        Route('shows_page', get(f'/shows?after={show_cursor}')),
+        Route('create_shows', get('/shows/create')),
+        Route('metrics', get('/metrics')),
+        # the whole table per request: the shows export is left out
+        Route('export_venues', get('/export/venues.csv')),
+        Route('export_artists', get('/export/artists.jsonl')),
+        Route('calendar', get('/calendar')),
+        Route('calendar_month', get('/calendar?when=this-month')),
+        Route('venue_calendar', get(f'/venues/{venue_id}/calendar.ics')),
+        Route('artist_calendar', get(f'/artists/{artist_id}/calendar.ics')),
+        Route('browse_venues', get(f'/venues/browse?{venue_filter}')),
+        Route('browse_artists', get(f'/artists/browse?{artist_filter}')),
+        Route('create_venue_submission', lambda i: (
+            'POST', '/venues/create', venue_form(i)), readonly=False),
+        Route('edit_venue_submission', lambda i: (
+            'POST', f'/venues/{venue_id}/edit', venue_form(i)), readonly=False),
+        Route('create_artist_submission', lambda i: (
+            'POST', '/artists/create', artist_form(i)), readonly=False),
+        Route('edit_artist_submission', lambda i: (
+            'POST', f'/artists/{artist_id}/edit', artist_form(i)), readonly=False),
+        Route('create_show_submission', lambda i: (
+            'POST', '/shows/create', show_form(i)), readonly=False),
+        Route('delete_venue', lambda i: (
+            'POST', f'/venues/{next(deletions)}', {'delete': 'Delete'}),
+            readonly=False),
+    ]
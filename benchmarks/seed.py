@@ -0,0 +1,133 @@
+"""Seed the configured database with a synthetic catalog.
+
+    python -m benchmarks.seed --venues 10000 --artists 20000 --shows 500000
+
+Existing venues, artists and shows are deleted first.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from forms import VenueForm
+from models import db, Venue, Artist, Show
+from counters import recount
+
+BATCH_SIZE = 10000
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('San Diego', 'CA'),
+    ('New York', 'NY'), ('Brooklyn', 'NY'), ('Austin', 'TX'),
+    ('Houston', 'TX'), ('Chicago', 'IL'), ('Seattle', 'WA'),
+    ('Portland', 'OR'), ('Denver', 'CO'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Atlanta', 'GA'), ('Boston', 'MA'),
+    ('Miami', 'FL'), ('Detroit', 'MI'), ('Minneapolis', 'MN'),
+    ('Philadelphia', 'PA'), ('Phoenix', 'AZ'),
+]
+WORDS = ['Blue', 'Red', 'Velvet', 'Golden', 'Electric', 'Silent', 'Wild',
+         'Midnight', 'Neon', 'Hollow', 'Crimson', 'Lucky', 'Echo', 'Iron',
+         'Lunar', 'Paper', 'Glass', 'Rolling', 'Broken', 'Atomic']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Club', 'Theatre', 'Tavern', 'Stage']
+ARTIST_NOUNS = ['Band', 'Collective', 'Quartet', 'Trio', 'Kids', 'Orchestra']
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+
+
+def batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(table, rows):
+    for batch in batches(rows):
+        db.session.execute(table.insert(), batch)
+
+
+def venue_rows(rng, count):
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': f'The {rng.choice(WORDS)} {rng.choice(VENUE_NOUNS)} {i}',
+            'city': city,
+            'state': state,
+            'address': f'{rng.randint(1, 9999)} {rng.choice(WORDS)} St',
+            'phone': f'{rng.randint(100, 999)}-555-{rng.randint(1000, 9999)}',
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://images.example.com/venues/{i}.jpg',
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': '',
+        }
+
+
+def artist_rows(rng, count):
+    for i in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': f'{rng.choice(WORDS)} {rng.choice(ARTIST_NOUNS)} {i}',
+            'city': city,
+            'state': state,
+            'phone': f'{rng.randint(100, 999)}-555-{rng.randint(1000, 9999)}',
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://images.example.com/artists/{i}.jpg',
+            'seeking_venue': rng.random() < 0.3,
+            'seeking_description': '',
+        }
+
+
+def show_rows(rng, count, venue_ids, artist_ids, days):
+    now = datetime.today().replace(minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        yield {
+            'venue_id': rng.choice(venue_ids),
+            'artist_id': rng.choice(artist_ids),
+            'start_time': now + timedelta(hours=rng.randint(-24 * days, 24 * days)),
+        }
+
+
+def seed(venues, artists, shows, days=365, seed=0):
+    """Replace the catalog with a generated one; needs an app context."""
+    rng = random.Random(seed)
+    for model in (Show, Venue, Artist):
+        db.session.execute(model.__table__.delete())
+
+    insert(Venue.__table__, venue_rows(rng, venues))
+    insert(Artist.__table__, artist_rows(rng, artists))
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id)]
+    if venue_ids and artist_ids:
+        insert(Show.__table__,
+               show_rows(rng, shows, venue_ids, artist_ids, days))
+
+    # core inserts bypass the ORM events that maintain the counters
+    recount(Venue, Show.venue_id)
+    recount(Artist, Show.artist_id)
+    db.session.commit()
+
+
+def add_arguments(parser):
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=365,
+                        help='shows are spread over +/- this many days')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        seed(args.venues, args.artists, args.shows, args.days, args.seed)
+    print(f'seeded {args.venues} venues, {args.artists} artists, '
+          f'{args.shows} shows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Benchmark every route of app.py and save the results as JSON.
+
+Seeds a catalog, then
+  1. drives every route sequentially with the Flask test client, recording
+     latency percentiles and the number of SQL statements per request;
+  2. serves the app on a local threaded HTTP server and loads the read-only
+     routes (plus the write routes with --load-writes) from --concurrency
+     client threads, recording throughput and latency percentiles.
+
+SQLite is used unless --database-url points elsewhere; a Postgres database
+must already be migrated and is overwritten, so use a disposable one.
+
+    python -m benchmarks.suite --shows 100000 --output bench.json
+    python -m benchmarks.suite --shows 100000 --baseline bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from werkzeug.serving import make_server
+
+from benchmarks import seed as seeding
+from benchmarks.routes import all_routes
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies):
+    return {
+        'requests': len(latencies),
+        'mean_ms': statistics.mean(latencies),
+        'p50_ms': percentile(latencies, 0.50),
+        'p90_ms': percentile(latencies, 0.90),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': max(latencies),
+    }
+
+
+#----------------------------------------------------------------------------#
+# Test client.
+#----------------------------------------------------------------------------#
+
+
+def run_client(app, db, routes, requests, cold_cache):
+    queries = [0]
+
+    def count_query(*args):
+        queries[0] += 1
+
+    results = {}
+    event.listen(db.engine, 'before_cursor_execute', count_query)
+    try:
+        client = app.test_client()
+        for route in routes:
+            latencies, query_counts, statuses = [], [], set()
+            for i in range(requests):
+                if cold_cache:
+                    app.extensions['cache'].clear()
+                method, url, data = route(i)
+                queries[0] = 0
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                latencies.append((time.perf_counter() - started) * 1000)
+                query_counts.append(queries[0])
+                statuses.add(response.status_code)
+            results[route.name] = dict(
+                summarize(latencies),
+                queries_mean=statistics.mean(query_counts),
+                queries_max=max(query_counts),
+                statuses=sorted(statuses),
+            )
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_query)
+    return results
+
+
+#----------------------------------------------------------------------------#
+# HTTP load.
+#----------------------------------------------------------------------------#
+
+
+def send(base_url, method, url, data, headers=None):
+    body = None
+    if data is not None:
+        body = urllib.parse.urlencode(data, doseq=True).encode()
+    request = urllib.request.Request(base_url + url, data=body, method=method,
+                                     headers=headers or {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return (time.perf_counter() - started) * 1000, status
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_load(app, routes, requests, concurrency):
+    # redirects after form posts are reported as 302s, not followed
+    urllib.request.install_opener(urllib.request.build_opener(NoRedirect))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(concurrency) as pool:
+            for route in routes:
+                calls = [route(i) for i in range(requests)]
+                started = time.perf_counter()
+                outcomes = list(pool.map(
+                    lambda call: send(base_url, *call), calls))
+                elapsed = time.perf_counter() - started
+                latencies = [latency for latency, _ in outcomes]
+                results[route.name] = dict(
+                    summarize(latencies),
+                    throughput_rps=requests / elapsed,
+                    errors=sum(status >= 500 for _, status in outcomes),
+                )
+    finally:
+        server.shutdown()
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Report.
+#----------------------------------------------------------------------------#
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(title, results, columns):
+    print(f'== {title}')
+    print(f"{'route':>26} " + ' '.join(f'{column:>14}' for column in columns))
+    for name, result in results.items():
+        print(f'{name:>26} ' + ' '.join(
+            f'{result[column]:>14.2f}' for column in columns))
+
+
+def compare(baseline, report):
+    print(f"== change against {baseline['meta'].get('revision')} "
+          f"({baseline['meta']['started_at']})")
+    for section, metric in (('client', 'p50_ms'), ('load', 'p50_ms'),
+                            ('load', 'throughput_rps')):
+        for name, result in report.get(section, {}).items():
+            before = baseline.get(section, {}).get(name, {}).get(metric)
+            if before:
+                change = (result[metric] - before) / before * 100
+                print(f'{section:>6} {name:>26} {metric:>14}: '
+                      f'{before:10.2f} -> {result[metric]:10.2f} ({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--database-url',
+                        help='defaults to a fresh SQLite file in the temp dir')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='test client requests per route')
+    parser.add_argument('--load-requests', type=int, default=200,
+                        help='HTTP requests per route under load')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--load-writes', action='store_true',
+                        help='also load the create and edit routes')
+    parser.add_argument('--cold-cache', action='store_true',
+                        help='clear the detail cache before every request')
+    parser.add_argument('--skip-load', action='store_true')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with an earlier --output')
+    args = parser.parse_args()
+
+    import config
+    from app import app, db
+    from search import init_search
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur-bench.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(database_url)
+    app.config['WTF_CSRF_ENABLED'] = False
+    init_search(app)
+
+    report = {'meta': {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'database': make_url(database_url).get_backend_name(),
+        'venues': args.venues, 'artists': args.artists, 'shows': args.shows,
+        'requests': args.requests, 'load_requests': args.load_requests,
+        'concurrency': args.concurrency, 'cold_cache': args.cold_cache,
+    }}
+
+    with app.app_context():
+        if database_url.startswith('sqlite'):
+            db.drop_all()
+            db.create_all()
+        seeding.seed(args.venues, args.artists, args.shows,
+                     args.days, args.seed)
+        routes = all_routes(deletable=args.requests)
+        report['client'] = run_client(app, db, routes, args.requests,
+                                      args.cold_cache)
+        db.session.remove()
+
+        if not args.skip_load:
+            load_routes = [route for route in routes if route.readonly or (
+                args.load_writes and route.name != 'delete_venue')]
+            report['load'] = run_load(app, load_routes, args.load_requests,
+                                      args.concurrency)
+
+    print_results('test client', report['client'],
+                  ['p50_ms', 'p90_ms', 'p99_ms', 'queries_mean'])
+    if 'load' in report:
+        print_results(f'http load x{args.concurrency}', report['load'],
+                      ['throughput_rps', 'p50_ms', 'p90_ms', 'p99_ms'])
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from models import db, Show, SHOW_MAX_MINUTES
+
+
+#----------------------------------------------------------------------------#
+# Booking conflicts.
+#
+# A venue or an artist cannot play two shows at once. Show durations are
+# capped at SHOW_MAX_MINUTES (a CHECK constraint), so every show that can
+# overlap [start, end) starts within (start - SHOW_MAX_MINUTES, end): a
+# range scan of the (venue_id, start_time) or (artist_id, start_time) index
+# that returns a handful of candidates, then an exact overlap test. On
+# Postgres a booking first takes transaction-scoped advisory locks on its
+# venue and artist, so two concurrent bookings cannot both pass the check.
+#
+# Imports check a whole batch at once against an IntervalIndex, the same
+# bounded window found by bisection in memory.
+#----------------------------------------------------------------------------#
+
+
+MAX_DURATION = timedelta(minutes=SHOW_MAX_MINUTES)
+
+# advisory lock key spaces; venues are always locked before artists
+VENUE_LOCK = 1
+ARTIST_LOCK = 2
+
+Conflict = namedtuple('Conflict', 'kind show_id start_time end_time')
+
+
+def end_of(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes)
+
+
+def conflict_message(conflict):
+    who = 'Venue' if conflict.kind == 'venue' else 'Artist'
+    # show_id is a label instead for rows of the same import
+    show = (f'show {conflict.show_id}' if isinstance(conflict.show_id, int)
+            else conflict.show_id)
+    return (f'{who} already booked from {conflict.start_time:%Y-%m-%d %H:%M} '
+            f'to {conflict.end_time:%Y-%m-%d %H:%M} ({show}).')
+
+
+def lock_bookings(venue_id, artist_id):
+    # held until the transaction ends
+    if db.session.connection().dialect.name != 'postgresql':
+        return
+    for space, entity_id in ((VENUE_LOCK, venue_id), (ARTIST_LOCK, artist_id)):
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:space, :id)'),
+                           {'space': space, 'id': entity_id})
+
+
+def find_conflicts(venue_id, artist_id, start_time, duration_minutes):
+    """The booked shows a new show would overlap, at its venue or artist."""
+    end = end_of(start_time, duration_minutes)
+    window = db.and_(Show.start_time > start_time - MAX_DURATION,
+                     Show.start_time < end)
+    # one round trip; each side of the OR is a range scan of its index
+    rows = db.session.query(
+        Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+        Show.duration_minutes
+    ).filter(db.or_(db.and_(Show.venue_id == venue_id, window),
+                    db.and_(Show.artist_id == artist_id, window)))
+    conflicts = []
+    for show_id, show_venue_id, show_artist_id, show_start, duration in rows:
+        show_end = end_of(show_start, duration)
+        if show_end <= start_time:
+            continue
+        if show_venue_id == venue_id:
+            conflicts.append(Conflict('venue', show_id, show_start, show_end))
+        if show_artist_id == artist_id:
+            conflicts.append(Conflict('artist', show_id, show_start, show_end))
+    return conflicts
+
+
+class IntervalIndex:
+    """Intervals of bounded length per key, sorted by start."""
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.starts = {}
+        self.intervals = {}
+
+    def add(self, key, start, end, ident=None):
+        starts = self.starts.setdefault(key, [])
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        self.intervals.setdefault(key, []).insert(i, (start, end, ident))
+
+    def overlapping(self, key, start, end):
+        starts = self.starts.get(key)
+        if not starts:
+            return []
+        low = bisect_right(starts, start - self.max_length)
+        high = bisect_left(starts, end)
+        return [interval for interval in self.intervals[key][low:high]
+                if interval[1] > start]
+
+
+def check_batch(rows, labels=None):
+    """Conflicts of each new show in `rows` (dicts with venue_id, artist_id,
+    start_time and duration_minutes), with the booked shows and with the
+    rows before it; one list per row, empty when it can be booked. Earlier
+    rows are named by `labels`, row 1, row 2... by default."""
+    if not rows:
+        return []
+    indexes = {'venue': IntervalIndex(MAX_DURATION),
+               'artist': IntervalIndex(MAX_DURATION)}
+    first = min(row['start_time'] for row in rows) - MAX_DURATION
+    last = max(end_of(row['start_time'], row['duration_minutes']) for row in rows)
+    for kind, key in (('venue', Show.venue_id), ('artist', Show.artist_id)):
+        ids = {row[f'{kind}_id'] for row in rows}
+        booked = db.session.query(
+            key, Show.id, Show.start_time, Show.duration_minutes).filter(
+            key.in_(ids), Show.start_time > first, Show.start_time < last
+        ).order_by(key, Show.start_time)
+        for entity_id, show_id, start, duration in booked:
+            indexes[kind].add(entity_id, start, end_of(start, duration), show_id)
+
+    labels = labels or [f'row {number}' for number in range(1, len(rows) + 1)]
+    results = []
+    for row, label in zip(rows, labels):
+        start = row['start_time']
+        end = end_of(start, row['duration_minutes'])
+        conflicts = [
+            Conflict(kind, ident, show_start, show_end)
+            for kind, index in indexes.items()
+            for show_start, show_end, ident in index.overlapping(
+                row[f'{kind}_id'], start, end)]
+        if not conflicts:
+            for kind, index in indexes.items():
+                index.add(row[f'{kind}_id'], start, end, label)
+        results.append(conflicts)
+    return results
@@ -0,0 +1,269 @@
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from models import db, Show, Venue, Artist
+
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#
+# Every backend offers get/set/delete plus get_or_set for read-through use,
+# and counts hits and misses so capacity and TTL can be tuned from stats().
+#----------------------------------------------------------------------------#
+
+
+class BaseCache:
+
+    def __init__(self, default_ttl=60):
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_set(self, key, loader, ttl=None):
+        # None is never cached, so unknown ids keep falling through to loader
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LRUCache(BaseCache):
+    """In-process LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, capacity=1024, default_ttl=60):
+        super().__init__(default_ttl)
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(size=len(self.entries), capacity=self.capacity,
+                     evictions=self.evictions)
+        return stats
+
+
+class RedisCache(BaseCache):
+    """Cache stored in any client speaking the redis-py get/set/delete API."""
+
+    def __init__(self, client, prefix='fyyur:', default_ttl=60):
+        super().__init__(default_ttl)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value),
+                        ex=ttl or self.default_ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class LocalRedis:
+    """Minimal in-process stand-in for a redis-py client, for dev and tests."""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            value, expires_at = self.data.get(name, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        expires_at = time.monotonic() + ex if ex else None
+        with self.lock:
+            self.data[name] = (value, expires_at)
+        return True
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match='*'):
+        prefix = match.rstrip('*')
+        with self.lock:
+            return [name for name in self.data if name.startswith(prefix)]
+
+
+def init_cache(app):
+    backend = app.config.get('CACHE_BACKEND', 'lru')
+    ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+
+    if backend == 'lru':
+        cache = LRUCache(app.config.get('CACHE_CAPACITY', 1024), ttl)
+    elif backend == 'redis':
+        url = app.config.get('CACHE_REDIS_URL', 'local://')
+        if url == 'local://':
+            client = LocalRedis()
+        else:
+            import redis
+            client = redis.Redis.from_url(url)
+        cache = RedisCache(client, app.config.get('CACHE_KEY_PREFIX', 'fyyur:'), ttl)
+    else:
+        raise ValueError(f'unknown CACHE_BACKEND: {backend!r}')
+
+    app.extensions['cache'] = cache
+    return cache
+
+
+#----------------------------------------------------------------------------#
+# Cached detail data.
+#----------------------------------------------------------------------------#
+
+
+def venue_key(venue_id):
+    return f'venue:{venue_id}'
+
+
+def artist_key(artist_id):
+    return f'artist:{artist_id}'
+
+
+def versioned_key(key, version):
+    # data cached for one Venue.version()/Artist.version() is never stale:
+    # any change makes a new key, whichever process made it
+    if version is None:
+        return key
+    return key + '@' + hashlib.sha1(repr(tuple(version)).encode()).hexdigest()[:16]
+
+
+def cached_venue_data(cache, venue_id, version=None):
+    def load():
+        venue = Venue.get_with_shows(venue_id)
+        return venue.venue_data() if venue else None
+    return cache.get_or_set(versioned_key(venue_key(venue_id), version), load)
+
+
+def cached_artist_data(cache, artist_id, version=None):
+    def load():
+        artist = Artist.get_with_shows(artist_id)
+        return artist.artist_data() if artist else None
+    return cache.get_or_set(versioned_key(artist_key(artist_id), version), load)
+
+
+#----------------------------------------------------------------------------#
+# Version stamps.
+#
+# Cached template fragments put the stamps of the entities they show in
+# their keys, so bumping a stamp orphans every fragment built from the old
+# one. A stamp that was evicted or expired comes back as a fresh random one,
+# never as a value an old fragment could still be keyed with.
+#----------------------------------------------------------------------------#
+
+
+# the venue listing, grouped by area
+VENUES_KEY = 'venues'
+VERSION_TTL = 24 * 60 * 60
+
+
+def version_key(key):
+    return f'version:{key}'
+
+
+def bump_versions(cache, *keys):
+    for key in keys:
+        cache.set(version_key(key), uuid.uuid4().hex[:12], VERSION_TTL)
+
+
+def entity_version(cache, key):
+    stamp = cache.get(version_key(key))
+    if stamp is None:
+        stamp = uuid.uuid4().hex[:12]
+        cache.set(version_key(key), stamp, VERSION_TTL)
+    return stamp
+
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#
+# Venue pages show artist names and artist pages show venue names, so a
+# change to one entity also drops the pages of its counterparts.
+#----------------------------------------------------------------------------#
+
+
+def invalidate(cache, *keys):
+    cache.delete(*keys)
+    bump_versions(cache, *keys)
+
+
+def invalidate_venue(cache, venue_id):
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct()
+    invalidate(cache, venue_key(venue_id),
+               *[artist_key(artist_id) for artist_id, in artist_ids])
+    bump_versions(cache, VENUES_KEY)
+
+
+def invalidate_artist(cache, artist_id):
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct()
+    invalidate(cache, artist_key(artist_id),
+               *[venue_key(venue_id) for venue_id, in venue_ids])
+
+
+def invalidate_show(cache, venue_id, artist_id):
+    invalidate(cache, venue_key(venue_id), artist_key(artist_id))
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# Venue and Artist carry upcoming_shows_count and past_shows_count so that
+# listings never touch the show table. ORM events keep them current when a
+# show is created, moved or deleted through the session (bulk query deletes
+# bypass them), and `flask counters rollover` moves shows from upcoming to
+# past once their start_time has passed. A deleted or moved show may have
+# started without being rolled over yet, so which counter it sits in is not
+# known from its start_time: its venue and artist are recounted instead.
+#----------------------------------------------------------------------------#
+
+
+def counter_column(model, start_time, now):
+    if start_time > now:
+        return model.__table__.c.upcoming_shows_count
+    return model.__table__.c.past_shows_count
+
+
+def bump(connection, venue_id, artist_id, start_time, delta):
+    now = datetime.today()
+    for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+        column = counter_column(model, start_time, now)
+        connection.execute(model.__table__.update().where(
+            model.__table__.c.id == entity_id
+        ).values({column: column + delta}))
+
+
+@event.listens_for(Show, 'after_insert')
+def show_inserted(mapper, connection, target):
+    bump(connection, target.venue_id, target.artist_id, target.start_time, 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def show_deleted(mapper, connection, target):
+    recount(Venue, Show.venue_id, [target.venue_id], connection=connection)
+    recount(Artist, Show.artist_id, [target.artist_id], connection=connection)
+
+
+@event.listens_for(Show, 'after_update')
+def show_updated(mapper, connection, target):
+    state = inspect(target)
+    venue_ids, artist_ids = {target.venue_id}, {target.artist_id}
+    changed = False
+    for attr, ids in (('venue_id', venue_ids), ('artist_id', artist_ids),
+                      ('start_time', None)):
+        history = state.attrs[attr].history
+        if history.deleted:
+            changed = True
+            if ids is not None:
+                ids.add(history.deleted[0])
+    if changed:
+        recount(Venue, Show.venue_id, venue_ids, connection=connection)
+        recount(Artist, Show.artist_id, artist_ids, connection=connection)
+
+
+def recount(model, show_key, ids=None, now=None, connection=None):
+    # exact recount from the show table, for every row or only `ids`; on
+    # `connection` inside a flush
+    now = now or datetime.today()
+    table = model.__table__
+
+    def count(condition):
+        return db.select([db.func.count(Show.id)]).where(
+            db.and_(show_key == table.c.id, condition)).as_scalar()
+
+    statement = table.update().values(
+        upcoming_shows_count=count(Show.start_time > now),
+        past_shows_count=count(Show.start_time <= now))
+    if ids is not None:
+        statement = statement.where(table.c.id.in_(ids))
+    return (connection or db.session).execute(statement).rowcount
+
+
+def rollover(since, now=None):
+    # recount the venues and artists of shows that started in (since, now];
+    # idempotent, so consecutive runs may use overlapping windows
+    now = now or datetime.today()
+    passed = db.and_(Show.start_time > since, Show.start_time <= now)
+    venue_ids = db.session.query(Show.venue_id).filter(passed).distinct()
+    artist_ids = db.session.query(Show.artist_id).filter(passed).distinct()
+    updated = (recount(Venue, Show.venue_id, venue_ids, now),
+               recount(Artist, Show.artist_id, artist_ids, now))
+    db.session.commit()
+    return updated
+
+
+def init_counters(app):
+    counters = AppGroup('counters', help='Maintain the show counters.')
+
+    @counters.command('rollover')
+    @click.option('--minutes', default=15, show_default=True,
+                  help='Look back this far for shows that have started; '
+                       'keep it above the scheduling interval.')
+    def rollover_command(minutes):
+        venues, artists = rollover(datetime.today() - timedelta(minutes=minutes))
+        click.echo(f'recounted {venues} venues and {artists} artists')
+
+    @counters.command('recount')
+    def recount_command():
+        venues = recount(Venue, Show.venue_id)
+        artists = recount(Artist, Show.artist_id)
+        db.session.commit()
+        click.echo(f'recounted {venues} venues and {artists} artists')
+
+    app.cli.add_command(counters)
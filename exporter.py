@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import click
+from flask import Response, abort, stream_with_context
+
+from models import db, Venue, Artist, Show
+from importer import VENUE_COLUMNS, ARTIST_COLUMNS, SHOW_COLUMNS
+
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#
+# Rows are written in the layout `flask import` reads, with the id in front,
+# so an export can be loaded into another database. `flask export` reads
+# the table through one server-side cursor (Query.yield_per), a consistent
+# snapshot in constant memory. The /export endpoint instead reads it in
+# keyset chunks of EXPORT_CHUNK_SIZE ids, each in its own short transaction,
+# so a slow client never keeps a transaction or a pooled connection open.
+#----------------------------------------------------------------------------#
+
+
+KINDS = {
+    'venues': (Venue, ('id',) + VENUE_COLUMNS),
+    'artists': (Artist, ('id',) + ARTIST_COLUMNS),
+    'shows': (Show, ('id',) + SHOW_COLUMNS),
+}
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def export_query(kind):
+    model, columns = KINDS[kind]
+    return db.session.query(
+        *[getattr(model, name) for name in columns]).order_by(model.id)
+
+
+def cursor_rows(kind, chunk_size=1000):
+    """Every row over a single server-side cursor."""
+    try:
+        yield from export_query(kind).yield_per(chunk_size)
+    finally:
+        db.session.rollback()
+
+
+def chunked_rows(kind, chunk_size=1000):
+    """Every row, one short transaction per chunk of ids."""
+    model, _ = KINDS[kind]
+    last_id = 0
+    while True:
+        rows = export_query(kind).filter(model.id > last_id).limit(chunk_size).all()
+        # hand the connection back before the rows are sent
+        db.session.rollback()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def encode(kind, rows, format):
+    """The export file as a stream of text chunks."""
+    _, columns = KINDS[kind]
+    if format == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=datetime.isoformat) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([csv_value(value) for value in row])
+        # flush every few kilobytes rather than per row
+        if buffer.tell() > 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def init_exporter(app):
+
+    @app.route('/export/<kind>.<any(csv, jsonl):format>')
+    def export(kind, format):
+        if kind not in KINDS:
+            abort(404)
+        rows = chunked_rows(kind, app.config.get('EXPORT_CHUNK_SIZE', 1000))
+        return Response(
+            stream_with_context(encode(kind, rows, format)),
+            mimetype=MIMETYPES[format],
+            headers={'Content-Disposition': f'attachment; filename={kind}.{format}'})
+
+    @app.cli.command('export')
+    @click.argument('kind', type=click.Choice(sorted(KINDS)))
+    @click.option('--format', type=click.Choice(sorted(MIMETYPES)),
+                  default='jsonl', show_default=True)
+    @click.option('--output', type=click.File('w', encoding='utf-8'),
+                  default='-', help='Defaults to stdout.')
+    @click.option('--chunk-size', default=1000, show_default=True,
+                  help='Rows fetched from the server-side cursor at a time.')
+    def export_command(kind, format, output, chunk_size):
+        """Export venues, artists or shows as JSONL or CSV."""
+        for chunk in encode(kind, cursor_rows(kind, chunk_size), format):
+            output.write(chunk)
@@ -13,6 +13,13 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench(baseline=None):
+    command = "python -m benchmarks.suite --output bench.json"
+    if baseline:
+        command += " --baseline {}".format(baseline)
+    local(command)
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
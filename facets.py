@@ -0,0 +1,330 @@
+import threading
+import time
+from bisect import bisect_right
+from functools import partial
+
+from flask import abort, render_template, request, url_for
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import ARRAY, array
+
+from models import db, Venue, Artist, after_commit
+
+
+#----------------------------------------------------------------------------#
+# Faceted browsing.
+#
+# Venues and artists are filtered by genre, city, state and seeking status;
+# several values of one facet match any of them (or, with ?match=all, every
+# selected genre), facets combine with AND. The listed rows come from SQL,
+# genres through the GIN indexes on the genres arrays (`&&` and `@>`). The
+# count of every facet value comes from bitmaps kept per process: one int
+# per value with a bit set for each entity that has it, so a count is an AND
+# and a popcount instead of a scan of the table. As usual each facet's own
+# counts ignore its own selection, showing what picking another value gives.
+# ORM events keep the bitmaps current with this process's writes, applied
+# when they commit; writes from elsewhere (other workers, `flask import`)
+# show up when they are rebuilt, every FACETS_REFRESH_SECONDS.
+#----------------------------------------------------------------------------#
+
+
+FACETS = ('genre', 'city', 'state', 'seeking')
+
+SEEKING = {Venue: Venue.seeking_talent, Artist: Artist.seeking_venue}
+
+# a facet is counted entity by entity below this many selected entities per
+# value, by a full-width AND per value above it
+WALK_RATIO = 20
+
+
+def positions(bitmap):
+    bits = bin(bitmap)[:1:-1]
+    found, position = [], bits.find('1')
+    while position != -1:
+        found.append(position)
+        position = bits.find('1', position + 1)
+    return found
+
+
+def parse_filters(args):
+    """Selected values per facet from ?genre=&city=&state=&seeking=;
+    raises ValueError on a seeking value other than true or false."""
+    filters = {facet: [value for value in args.getlist(facet) if value]
+               for facet in ('genre', 'city', 'state')}
+    seeking = []
+    for value in args.getlist('seeking'):
+        if value not in ('true', 'false'):
+            raise ValueError(f'seeking must be true or false, not {value!r}')
+        seeking.append(value == 'true')
+    filters['seeking'] = seeking
+    return filters
+
+
+class FacetBitmaps:
+    """Bitmaps over one model's entities, bit i standing for ids[i]."""
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+        self.values = {}
+        self.bitmaps = {facet: {} for facet in FACETS}
+        self.live = 0
+        # set when an id arrives out of order, to rebuild on next use
+        self.unordered = False
+        # counts over every entity, until the next add or remove
+        self.totals = None
+
+    @staticmethod
+    def facet_values(genres, city, state, seeking):
+        return {'genre': set(genres or ()), 'city': {city}, 'state': {state},
+                'seeking': {bool(seeking)}}
+
+    def add(self, entity_id, genres, city, state, seeking):
+        self.remove(entity_id)
+        self.totals = None
+        position = self.positions.get(entity_id)
+        if position is None:
+            if self.ids and entity_id < self.ids[-1]:
+                self.unordered = True
+            position = self.positions[entity_id] = len(self.ids)
+            self.ids.append(entity_id)
+        bit = 1 << position
+        values = self.values[entity_id] = self.facet_values(
+            genres, city, state, seeking)
+        for facet, facet_values in values.items():
+            bitmaps = self.bitmaps[facet]
+            for value in facet_values:
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+        self.live |= bit
+
+    def remove(self, entity_id):
+        values = self.values.pop(entity_id, None)
+        if values is None:
+            return
+        self.totals = None
+        bit = 1 << self.positions[entity_id]
+        for facet, facet_values in values.items():
+            bitmaps = self.bitmaps[facet]
+            for value in facet_values:
+                bitmaps[value] &= ~bit
+                if not bitmaps[value]:
+                    del bitmaps[value]
+        self.live &= ~bit
+
+    def select(self, filters, match='any', skip=None):
+        selected = self.live
+        for facet, values in filters.items():
+            if facet == skip or not values:
+                continue
+            bitmaps = self.bitmaps[facet]
+            if facet == 'genre' and match == 'all':
+                for value in values:
+                    selected &= bitmaps.get(value, 0)
+            else:
+                union = 0
+                for value in values:
+                    union |= bitmaps.get(value, 0)
+                selected &= union
+        return selected
+
+    @staticmethod
+    def ranked(counts):
+        return sorted(((value, count) for value, count in counts if count),
+                      key=lambda item: (-item[1], str(item[0])))
+
+    def total_counts(self, facet):
+        if self.totals is None:
+            self.totals = {name: self.ranked(
+                (value, bitmap.bit_count()) for value, bitmap in bitmaps.items())
+                for name, bitmaps in self.bitmaps.items()}
+        return self.totals[facet]
+
+    def counts(self, filters, match='any', limit=None):
+        """{facet: [(value, count)]}, most frequent first."""
+        result = {}
+        for facet in FACETS:
+            selected = self.select(filters, match, skip=facet)
+            if selected == self.live:
+                # nothing else selected: the counts of the whole catalog
+                result[facet] = self.total_counts(facet)[:limit]
+                continue
+            bitmaps = self.bitmaps[facet]
+            if selected.bit_count() < WALK_RATIO * len(bitmaps):
+                # fewer entities than values (cities): tally the entities
+                tally, values, ids = {}, self.values, self.ids
+                for position in positions(selected):
+                    for value in values[ids[position]][facet]:
+                        tally[value] = tally.get(value, 0) + 1
+                counts = tally.items()
+            else:
+                counts = ((value, (bitmap & selected).bit_count())
+                          for value, bitmap in bitmaps.items())
+            result[facet] = self.ranked(counts)[:limit]
+        return result
+
+    def page(self, selected, after=None, limit=50):
+        """Up to `limit` ids of `selected` after `after`, in id order."""
+        if after is not None:
+            start = bisect_right(self.ids, after)
+            selected = selected >> start << start
+        ids = []
+        while selected and len(ids) < limit:
+            lowest = selected & -selected
+            ids.append(self.ids[lowest.bit_length() - 1])
+            selected ^= lowest
+        return ids
+
+
+def filter_query(query, model, filters, match='any'):
+    # genres && / @> :genres are answered by the GIN index on genres
+    genres = filters.get('genre')
+    if genres:
+        genres = db.cast(array(genres), ARRAY(db.String))
+        query = query.filter(model.genres.op('@>' if match == 'all' else '&&')(genres))
+    if filters.get('city'):
+        query = query.filter(model.city.in_(filters['city']))
+    if filters.get('state'):
+        query = query.filter(model.state.in_(filters['state']))
+    if filters.get('seeking'):
+        query = query.filter(SEEKING[model].in_(filters['seeking']))
+    return query
+
+
+class Facets:
+
+    def __init__(self, refresh_seconds=300, max_values=50):
+        self.refresh_seconds = refresh_seconds
+        self.max_values = max_values
+        self.indexes = {}
+        self.built_at = {}
+        self.lock = threading.Lock()
+        for model in (Venue, Artist):
+            event.listen(model, 'after_insert', self.on_write)
+            event.listen(model, 'after_update', self.on_write)
+            event.listen(model, 'after_delete', self.on_delete)
+
+    def build(self, model):
+        index = FacetBitmaps()
+        rows = db.session.query(model.id, model.genres, model.city, model.state,
+                                SEEKING[model]).order_by(model.id)
+        for row in rows:
+            index.add(*row)
+        return index
+
+    def index(self, model):
+        now = time.monotonic()
+        if (model not in self.indexes or self.indexes[model].unordered
+                or now - self.built_at[model] >= self.refresh_seconds):
+            # claimed first, so concurrent requests keep using the old bitmaps
+            self.built_at[model] = now
+            index = self.build(model)
+            with self.lock:
+                self.indexes[model] = index
+        return self.indexes[model]
+
+    def on_write(self, mapper, connection, target):
+        after_commit(target, partial(
+            self.apply, mapper.class_, 'add', target.id,
+            list(target.genres or ()), target.city, target.state,
+            getattr(target, SEEKING[mapper.class_].key)))
+
+    def on_delete(self, mapper, connection, target):
+        after_commit(target, partial(
+            self.apply, mapper.class_, 'remove', target.id))
+
+    def apply(self, model, method, *args):
+        index = self.indexes.get(model)
+        if index is not None:
+            with self.lock:
+                getattr(index, method)(*args)
+
+    def browse(self, model, filters, match='any', after=None, limit=50):
+        """{"count", "facets", "data", "next"}: the matching entities in id
+        order, `limit` at a time after the id `after`."""
+        index = self.index(model)
+        with self.lock:
+            selected = index.select(filters, match)
+            count = selected.bit_count()
+            facets = index.counts(filters, match, self.max_values)
+            # without the array operators, the page comes from the bitmaps
+            ids = (None if db.session.connection().dialect.name == 'postgresql'
+                   else index.page(selected, after, limit + 1))
+
+        query = db.session.query(
+            model.id, model.name, model.city, model.state, model.genres,
+            SEEKING[model].label('seeking'), model.image_link,
+            model.upcoming_shows_count.label('num_upcoming_shows'))
+        if ids is None:
+            query = filter_query(query, model, filters, match)
+            if after is not None:
+                query = query.filter(model.id > after)
+        else:
+            query = query.filter(model.id.in_(ids))
+        rows = query.order_by(model.id).limit(limit + 1).all()
+
+        return {
+            "count": count,
+            "facets": facets,
+            "data": [row._asdict() for row in rows[:limit]],
+            "next": rows[limit - 1].id if len(rows) > limit else None,
+        }
+
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+
+def facet_links(endpoint, args, counts):
+    """Each facet value with its count, whether it is selected and the URL
+    toggling it."""
+    links = {}
+    for facet, values in counts.items():
+        selected = args.getlist(facet)
+        links[facet] = []
+        for value, count in values:
+            param = ('true' if value else 'false') if facet == 'seeking' else value
+            toggled = args.copy()
+            toggled.poplist('after')
+            if param in selected:
+                toggled.setlist(facet, [v for v in selected if v != param])
+            else:
+                toggled.add(facet, param)
+            links[facet].append({
+                "value": value, "count": count, "selected": param in selected,
+                "url": url_for(endpoint, **toggled.to_dict(flat=False)),
+            })
+    return links
+
+
+def init_facets(app):
+    facets = Facets(app.config.get('FACETS_REFRESH_SECONDS', 300),
+                    app.config.get('FACETS_MAX_VALUES', 50))
+    app.extensions['facets'] = facets
+
+    def browse(model, kind):
+        try:
+            filters = parse_filters(request.args)
+        except ValueError:
+            abort(400)
+        match = 'all' if request.args.get('match') == 'all' else 'any'
+        results = facets.browse(model, filters, match,
+                                after=request.args.get('after', type=int),
+                                limit=app.config.get('BROWSE_PER_PAGE', 50))
+        endpoint = f'browse_{kind}'
+        next_args = request.args.copy()
+        next_args['after'] = results['next']
+        return render_template(
+            'pages/browse.html', kind=kind, results=results,
+            links=facet_links(endpoint, request.args, results['facets']),
+            next_url=(url_for(endpoint, **next_args.to_dict(flat=False))
+                      if results['next'] is not None else None))
+
+    @app.route('/venues/browse')
+    def browse_venues():
+        return browse(Venue, 'venues')
+
+    @app.route('/artists/browse')
+    def browse_artists():
+        return browse(Artist, 'artists')
+
+    return facets
@@ -1,7 +1,8 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, TextAreaField
-from wtforms.validators import DataRequired, AnyOf, URL, Optional
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, TextAreaField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, NumberRange
+from models import SHOW_DEFAULT_MINUTES, SHOW_MAX_MINUTES
 
 
 class ShowForm(FlaskForm):
@@ -16,6 +17,11 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[Optional(), NumberRange(1, SHOW_MAX_MINUTES)],
+        default=SHOW_DEFAULT_MINUTES
+    )
 
 
 class VenueForm(FlaskForm):
@@ -0,0 +1,107 @@
+import hashlib
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import venue_key, artist_key, entity_version
+
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#
+#   {% cache ['venue-past', venue.id, cache_version('venue', venue.id)], 3600 %}
+#       ...
+#   {% endcache %}
+#
+# keeps the rendered block in a store with the get/set API of cache.py (the
+# app cache unless init_fragments is given another one) under the key, a
+# string or a list of parts, for ttl seconds (FRAGMENT_CACHE_TTL if left
+# out). Keys are scoped to the template and line of the block and to a
+# digest of the template sources, so edited templates never reuse fragments
+# rendered by an older deploy. cache_version(kind, id) is the version stamp
+# invalidate_venue/_artist/_show bump, so an edit reaches every fragment
+# whose key includes it.
+#----------------------------------------------------------------------------#
+
+
+VERSION_KEYS = {'venue': venue_key, 'artist': artist_key}
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None,
+                           fragment_cache_prefix='fragment',
+                           fragment_cache_ttl=None)
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        args.append(nodes.Const(f'{parser.name}:{lineno}'))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('render_cached', args),
+                               [], [], body).set_lineno(lineno)
+
+    def render_cached(self, key, ttl, location, caller):
+        store = self.environment.fragment_cache
+        if store is None:
+            return caller()
+        if isinstance(key, (list, tuple)):
+            key = ':'.join(str(part) for part in key)
+        key = f'{self.environment.fragment_cache_prefix}:{location}:{key}'
+        html = store.get(key)
+        if html is None:
+            self.misses += 1
+            html = str(caller())
+            store.set(key, html, ttl or self.environment.fragment_cache_ttl)
+        else:
+            self.hits += 1
+        return Markup(html)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def templates_digest(env):
+    digest = hashlib.sha1()
+    for name in sorted(env.loader.list_templates()):
+        source, _, _ = env.loader.get_source(env, name)
+        digest.update(name.encode('utf-8') + b'\0' + source.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def init_fragments(app, store=None):
+    env = app.jinja_env
+    env.add_extension(FragmentCacheExtension)
+    extension = env.extensions[FragmentCacheExtension.identifier]
+    store = store if store is not None else app.extensions['cache']
+
+    enabled = app.config.get('FRAGMENT_CACHE_ENABLED', True)
+    if enabled:
+        env.fragment_cache = store
+        env.fragment_cache_prefix = f'fragment:{templates_digest(env)}'
+        env.fragment_cache_ttl = app.config.get('FRAGMENT_CACHE_TTL', 3600)
+
+    def cache_version(kind, entity_id=None):
+        if not enabled:
+            return None
+        key = kind if entity_id is None else VERSION_KEYS[kind](entity_id)
+        return entity_version(store, key)
+
+    env.globals['cache_version'] = cache_version
+    app.extensions['fragments'] = extension
+    return extension
@@ -0,0 +1,67 @@
+import hashlib
+import time
+
+from flask import current_app, g, request, session
+from flask_wtf.csrf import generate_csrf
+
+from fragments import templates_digest
+
+
+#----------------------------------------------------------------------------#
+# HTTP caching of the pages.
+#
+# A view calls check_etag() with what its page is built from (the entity
+# versions, or the listing rows) before doing the expensive part; when the
+# browser already holds that page it answers 304 Not Modified instead of
+# rendering. The weak ETag also covers the template sources and the
+# session's CSRF token, which every page embeds, and changes at least every
+# half WTF_CSRF_TIME_LIMIT so a revalidated page never carries an expired
+# token. Cache-Control comes from HTTP_CACHE_CONTROL, by endpoint.
+#----------------------------------------------------------------------------#
+
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def weak_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def check_etag(*parts):
+    """Set the page's ETag from `parts`; True if the browser already has it."""
+    if session.get('_flashes'):
+        # a page showing flashed messages must not be revalidated later
+        return False
+    config = current_app.config
+    # the token is put in the session here, not later by the template, so
+    # the first page's ETag already covers it
+    generate_csrf()
+    token_lifetime = config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    g.page_etag = weak_etag(
+        current_app.extensions['http_cache'],
+        session.get(config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')),
+        int(time.time() // (token_lifetime / 2)) if token_lifetime else None,
+        *parts)
+    return request.if_none_match.contains_weak(g.page_etag)
+
+
+def not_modified():
+    return current_app.response_class(status=304)
+
+
+def init_http_cache(app):
+    controls = app.config.get('HTTP_CACHE_CONTROL') or {}
+    app.extensions['http_cache'] = templates_digest(app.jinja_env)
+
+    @app.after_request
+    def set_cache_headers(response):
+        if (request.method not in SAFE_METHODS
+                or response.status_code not in (200, 304)):
+            return response
+        etag = g.get('page_etag')
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        control = controls.get(request.endpoint)
+        if control and 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = control
+        return response
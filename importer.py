@@ -0,0 +1,314 @@
+import csv
+import io
+import itertools
+import json
+import os
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from wtforms import BooleanField, DateTimeField, IntegerField, SelectMultipleField
+
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, ImportCheckpoint
+from counters import recount
+from recommendations import mark_stale
+from bookings import check_batch, conflict_message
+from cache import VENUES_KEY, venue_key, artist_key, invalidate, bump_versions
+
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+# `flask import venues|artists|shows FILE` streams a CSV or JSONL file,
+# validates every row with the form the create views use (plus the column
+# lengths and, for shows, that the venue and artist exist and are free at
+# that time, see bookings.check_batch) and inserts the valid rows in
+# batches: COPY on Postgres, executemany elsewhere. Each batch commits
+# together with its checkpoint, so an interrupted import resumes after the
+# last committed batch. Rejected rows go to an errors file.
+#----------------------------------------------------------------------------#
+
+
+BATCH_SIZE = 5000
+FALSE_VALUES = ('', '0', 'false', 'f', 'n', 'no', 'off')
+
+VENUE_COLUMNS = ('name', 'city', 'state', 'address', 'phone', 'genres',
+                 'website_link', 'image_link', 'facebook_link',
+                 'seeking_talent', 'seeking_description')
+ARTIST_COLUMNS = ('name', 'city', 'state', 'phone', 'genres',
+                  'website_link', 'image_link', 'facebook_link',
+                  'seeking_venue', 'seeking_description')
+SHOW_COLUMNS = ('venue_id', 'artist_id', 'start_time', 'duration_minutes')
+
+KINDS = {
+    'venues': (Venue, VenueForm, VENUE_COLUMNS),
+    'artists': (Artist, ArtistForm, ARTIST_COLUMNS),
+    'shows': (Show, ShowForm, SHOW_COLUMNS),
+}
+
+
+class BatchFailed(Exception):
+    pass
+
+
+def read_rows(f, format):
+    if format == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield line
+
+
+class RowValidator:
+    """Turns a raw row into column values, or the reasons it is rejected."""
+
+    def __init__(self, kind):
+        self.model, form_class, self.columns = KINDS[kind]
+        # one form, reprocessed for every row
+        self.form = form_class(formdata=None, meta={'csrf': False})
+        table = self.model.__table__
+        self.lengths = {column.name: column.type.length
+                        for column in table.columns
+                        if getattr(column.type, 'length', None)}
+        self.required = [name for name in self.columns
+                         if not table.c[name].nullable
+                         and table.c[name].default is None]
+        self.venue_ids = self.artist_ids = None
+        if self.model is Show:
+            self.venue_ids = {venue_id for venue_id, in db.session.query(Venue.id)}
+            self.artist_ids = {artist_id for artist_id, in db.session.query(Artist.id)}
+
+    def formdata(self, row):
+        formdata = MultiDict()
+        for name, value in row.items():
+            field = self.form._fields.get(name)
+            if field is None or value is None:
+                continue
+            if isinstance(field, IntegerField) and str(value).strip() == '':
+                # an empty cell leaves the field's default
+                continue
+            if isinstance(field, SelectMultipleField):
+                if isinstance(value, str):
+                    value = [item.strip() for item in value.split(',') if item.strip()]
+                for item in value:
+                    formdata.add(name, item)
+            elif isinstance(field, BooleanField):
+                if str(value).strip().lower() not in FALSE_VALUES:
+                    formdata.add(name, 'y')
+            elif isinstance(field, DateTimeField):
+                # ISO timestamps (JSONL) are accepted as well as the form format
+                try:
+                    value = datetime.fromisoformat(value).strftime(field.format)
+                except (TypeError, ValueError):
+                    pass
+                formdata.add(name, value)
+            else:
+                formdata.add(name, str(value))
+        return formdata
+
+    def __call__(self, row):
+        if not isinstance(row, dict):
+            return None, {'row': ['Not a JSON object.']}
+        errors = {}
+        for name in self.required:
+            if row.get(name) in (None, '', []):
+                errors[name] = ['This field is required.']
+        if errors:
+            return None, errors
+
+        self.form.process(self.formdata(row))
+        if not self.form.validate():
+            return None, dict(self.form.errors)
+
+        values = {name: self.form.data[name] for name in self.columns}
+        for name, length in self.lengths.items():
+            if isinstance(values.get(name), str) and len(values[name]) > length:
+                errors[name] = [f'Longer than {length} characters.']
+        if self.model is Show:
+            for name, known in (('venue_id', self.venue_ids),
+                                ('artist_id', self.artist_ids)):
+                try:
+                    values[name] = int(values[name])
+                except (TypeError, ValueError):
+                    errors[name] = ['Not an id.']
+                    continue
+                if values[name] not in known:
+                    errors[name] = ['No such id.']
+        if errors:
+            return None, errors
+        return values, None
+
+
+#----------------------------------------------------------------------------#
+# Inserts.
+#----------------------------------------------------------------------------#
+
+
+def array_literal(values):
+    return '{' + ','.join(
+        '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for value in values) + '}'
+
+
+def copy_rows(connection, table, columns, rows):
+    buffer = io.StringIO()
+    # QUOTE_NONNUMERIC keeps '' (quoted) apart from NULL (empty)
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([array_literal(row[name]) if isinstance(row[name], list)
+                         else row[name] for name in columns])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(
+        f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer)
+
+
+def insert_rows(table, columns, rows):
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        copy_rows(connection, table, columns, rows)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def expire_cached(kind, rows):
+    # only reaches the web workers when they share the cache (redis)
+    cache = current_app.extensions.get('cache')
+    if cache is None:
+        return
+    if kind == 'venues':
+        bump_versions(cache, VENUES_KEY)
+    elif kind == 'shows':
+        invalidate(cache,
+                   *{venue_key(row['venue_id']) for row in rows},
+                   *{artist_key(row['artist_id']) for row in rows})
+
+
+#----------------------------------------------------------------------------#
+# Driver.
+#----------------------------------------------------------------------------#
+
+
+def write_error(errors_file, number, row, row_errors):
+    errors_file.write(json.dumps(
+        {'row': number, 'errors': row_errors, 'data': row}, default=str) + '\n')
+
+
+def import_file(kind, path, format=None, batch_size=BATCH_SIZE, restart=False,
+                errors_path=None, echo=print):
+    """Import `path` batch by batch; returns the final ImportCheckpoint."""
+    format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+    source = os.path.abspath(path)
+    model, _, columns = KINDS[kind]
+    validate = RowValidator(kind)
+    # COPY runs on the raw DBAPI cursor, so its errors are not wrapped
+    database_errors = (SQLAlchemyError, db.engine.dialect.dbapi.Error)
+
+    checkpoint = ImportCheckpoint.query.get(source)
+    if checkpoint is not None and checkpoint.kind != kind:
+        raise ValueError(f'{path} was imported as {checkpoint.kind}, not {kind}')
+    if checkpoint is None or restart:
+        checkpoint = db.session.merge(ImportCheckpoint(
+            source=source, kind=kind, rows_done=0, inserted=0, rejected=0))
+    elif checkpoint.rows_done:
+        echo(f'resuming after row {checkpoint.rows_done}')
+
+    errors_path = errors_path or path + '.errors.jsonl'
+    errors_mode = 'a' if checkpoint.rows_done else 'w'
+    with open(path, newline='', encoding='utf-8') as f, \
+            open(errors_path, errors_mode, encoding='utf-8') as errors_file:
+        rows = itertools.islice(read_rows(f, format), checkpoint.rows_done, None)
+        number = checkpoint.rows_done
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            first = number + 1
+            accepted, rejected = [], 0
+            for row in batch:
+                number += 1
+                values, row_errors = validate(row)
+                if row_errors:
+                    rejected += 1
+                    write_error(errors_file, number, row, row_errors)
+                else:
+                    accepted.append((number, row, values))
+
+            if model is Show and accepted:
+                # overlapping bookings, with the database and within the file
+                conflicts = check_batch([values for _, _, values in accepted],
+                                        [f'row {n}' for n, _, _ in accepted])
+                free = []
+                for (row_number, row, values), row_conflicts in zip(accepted, conflicts):
+                    if row_conflicts:
+                        rejected += 1
+                        write_error(errors_file, row_number, row, {'start_time': [
+                            conflict_message(conflict) for conflict in row_conflicts]})
+                    else:
+                        free.append((row_number, row, values))
+                accepted = free
+            valid = [values for _, _, values in accepted]
+
+            try:
+                if valid:
+                    insert_rows(model.__table__, columns, valid)
+                if model is Show and valid:
+                    # core inserts bypass the ORM events behind the counters
+                    # and the stale recommendation lists
+                    recount(Venue, Show.venue_id, {row['venue_id'] for row in valid})
+                    recount(Artist, Show.artist_id, {row['artist_id'] for row in valid})
+                    mark_stale(db.session.connection(),
+                               *{('venue', row['venue_id']) for row in valid},
+                               *{('artist', row['artist_id']) for row in valid})
+                checkpoint.rows_done = number
+                checkpoint.inserted += len(valid)
+                checkpoint.rejected += rejected
+                checkpoint.updated_at = datetime.today()
+                db.session.commit()
+            except database_errors as e:
+                db.session.rollback()
+                raise BatchFailed(
+                    f'rows {first}-{number}: batch failed, nothing from it was '
+                    f'imported; rerun to resume at row {first}\n{e}')
+            if valid:
+                expire_cached(kind, valid)
+            errors_file.flush()
+            echo(f'rows {first}-{number}: {len(valid)} imported, {rejected} rejected'
+                 + (f' (see {errors_path})' if rejected else ''))
+    return checkpoint
+
+
+def init_importer(app):
+
+    @app.cli.command('import')
+    @click.argument('kind', type=click.Choice(sorted(KINDS)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(['csv', 'jsonl']),
+                  help='Defaults to csv for *.csv files and jsonl otherwise.')
+    @click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+    @click.option('--restart', is_flag=True,
+                  help='Start from the first row instead of the checkpoint.')
+    @click.option('--errors', 'errors_path',
+                  help='Rejected rows are appended here (JSONL); '
+                       'defaults to PATH.errors.jsonl.')
+    def import_command(kind, path, format, batch_size, restart, errors_path):
+        """Bulk import venues, artists or shows from a CSV or JSONL file.
+
+        CSV columns are named after the form fields; genres are comma
+        separated and start_time is YYYY-MM-DD HH:MM:SS or ISO 8601.
+        """
+        try:
+            checkpoint = import_file(kind, path, format, batch_size, restart,
+                                     errors_path, echo=click.echo)
+        except (ValueError, BatchFailed) as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{checkpoint.rows_done} rows read: {checkpoint.inserted} '
+                   f'imported, {checkpoint.rejected} rejected')
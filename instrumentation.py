@@ -0,0 +1,101 @@
+import json
+import logging
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+#
+# Cursor events on every Engine (so replicas and lazily created engines are
+# covered too) time each statement and add it to the stats of the current
+# request, which are logged through app.logger (at DEBUG, or at WARNING when
+# a statement took SLOW_QUERY_MS or more, so error.log only gets the slow
+# requests) and, when QUERY_STATS_HEADERS is on, returned as response
+# headers.
+#----------------------------------------------------------------------------#
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+
+    def __init__(self, budget=None, top=3):
+        self.budget = budget
+        self.top = top
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []
+
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.slowest.append((elapsed_ms, statement))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[self.top:]
+        if self.budget is not None and self.count > self.budget:
+            raise QueryBudgetExceeded(
+                f'{request.endpoint} issued more than {self.budget} queries')
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('query_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_started_at'].pop()) * 1000
+    stats = current_stats()
+    if stats is not None:
+        stats.record(' '.join(statement.split()), elapsed_ms)
+
+
+def init_instrumentation(app):
+    headers = app.config.get('QUERY_STATS_HEADERS', app.debug)
+    slow_query_ms = app.config.get('SLOW_QUERY_MS', 100)
+
+    @app.before_request
+    def start_query_stats():
+        budget = None
+        if app.testing:
+            budget = app.config.get('QUERY_BUDGETS', {}).get(
+                request.endpoint, app.config.get('QUERY_BUDGET'))
+        g.query_stats = QueryStats(budget, app.config.get('QUERY_STATS_TOP', 3))
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+
+        slow = [(elapsed_ms, statement) for elapsed_ms, statement
+                in stats.slowest if elapsed_ms >= slow_query_ms]
+        app.logger.log(logging.WARNING if slow else logging.DEBUG, json.dumps({
+            "event": "request_queries",
+            "method": request.method,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "query_count": stats.count,
+            "db_time_ms": round(stats.total_ms, 3),
+            "slowest": [{"ms": round(elapsed_ms, 3), "sql": statement[:500]}
+                        for elapsed_ms, statement in stats.slowest],
+        }))
+
+        if headers:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time'] = f'{stats.total_ms:.3f}'
+            response.headers.add(
+                'Server-Timing', f'db;desc="{stats.count} queries";dur={stats.total_ms:.3f}')
+        return response
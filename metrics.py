@@ -0,0 +1,359 @@
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import (Response, before_render_template, g, request,
+                   signals_available, template_rendered)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool, QueuePool
+
+from models import db
+
+
+#----------------------------------------------------------------------------#
+# Prometheus-style metrics.
+#
+# Each thread updates its own shard of plain dicts, so recording a sample
+# takes no lock; /metrics sums the shards. Under gunicorn every worker also
+# dumps its totals to METRICS_DIR/<pid>.json and /metrics merges the files,
+# so whichever worker answers the scrape reports the whole server.
+#----------------------------------------------------------------------------#
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'fyyur_http_request_duration_seconds': (
+        'histogram', 'Time spent handling a request, by endpoint.'),
+    'fyyur_http_responses_total': (
+        'counter', 'Responses sent, by endpoint and status code.'),
+    'fyyur_template_render_seconds': (
+        'histogram', 'Time spent rendering a template.'),
+    'fyyur_db_pool_checkout_seconds': (
+        'histogram', 'How long pooled connections stay checked out.'),
+    'fyyur_db_pool_checked_out': (
+        'gauge', 'Connections currently checked out of the pool.'),
+    'fyyur_db_pool_capacity': (
+        'gauge', 'Pool size plus max_overflow.'),
+    'fyyur_db_pool_saturation': (
+        'gauge', 'Checked out connections over pool capacity.'),
+    'fyyur_cache_hits_total': ('counter', 'Detail cache hits.'),
+    'fyyur_cache_misses_total': ('counter', 'Detail cache misses.'),
+    'fyyur_cache_evictions_total': ('counter', 'Detail cache LRU evictions.'),
+    'fyyur_cache_size': ('gauge', 'Entries in the detail cache.'),
+    'fyyur_cache_hit_ratio': ('gauge', 'Detail cache hits over lookups.'),
+}
+
+
+class Shard:
+    """Samples recorded by one thread: {(name, labels): value}."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # one count per bucket, then +Inf, then the sum
+            histogram = self.histograms[key] = [0] * (len(buckets) + 2)
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def merge(self, other):
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, histogram in list(other.histograms.items()):
+            mine = self.histograms.setdefault(key, [0] * len(histogram))
+            for i, value in enumerate(histogram):
+                mine[i] += value
+
+
+class Registry:
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+        self.retired = Shard()
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = Shard()
+            with self.lock:
+                self.retire_dead_threads()
+                self.shards.append((weakref.ref(threading.current_thread()), shard))
+            return shard
+
+    def retire_dead_threads(self):
+        # servers that start a thread per request would otherwise grow a
+        # shard per request; finished threads no longer touch theirs
+        live = []
+        for thread, shard in self.shards:
+            thread = thread()
+            if thread is not None and thread.is_alive():
+                live.append((weakref.ref(thread), shard))
+            else:
+                self.retired.merge(shard)
+        self.shards = live
+
+    def collect(self):
+        total = Shard()
+        with self.lock:
+            self.retire_dead_threads()
+            total.merge(self.retired)
+            for _, shard in self.shards:
+                total.merge(shard)
+        return total
+
+
+registry = Registry()
+
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+
+@event.listens_for(Pool, 'checkout')
+def pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info['checked_out_at'] = time.perf_counter()
+
+
+@event.listens_for(Pool, 'checkin')
+def pool_checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop('checked_out_at', None)
+    if started is not None:
+        registry.shard().observe('fyyur_db_pool_checkout_seconds', (),
+                                 time.perf_counter() - started)
+
+
+def pool_gauges(app):
+    gauges = {}
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+        pool = db.get_engine(app, bind).pool
+        if not isinstance(pool, QueuePool):
+            continue
+        labels = (('bind', bind or 'default'),)
+        gauges['fyyur_db_pool_checked_out', labels] = pool.checkedout()
+        # QueuePool has no public accessor for max_overflow; -1 is unbounded
+        if pool._max_overflow >= 0:
+            gauges['fyyur_db_pool_capacity', labels] = pool.size() + pool._max_overflow
+    return gauges
+
+
+def cache_samples(app):
+    counters, gauges = {}, {}
+    cache = app.extensions.get('cache')
+    if cache is not None:
+        stats = cache.stats()
+        for stat in ('hits', 'misses', 'evictions'):
+            if stat in stats:
+                counters[f'fyyur_cache_{stat}_total', ()] = stats[stat]
+        if 'size' in stats:
+            gauges['fyyur_cache_size', ()] = stats['size']
+    return counters, gauges
+
+
+#----------------------------------------------------------------------------#
+# Snapshots and aggregation across worker processes.
+#----------------------------------------------------------------------------#
+
+
+def snapshot(app):
+    shard = registry.collect()
+    counters, gauges = cache_samples(app)
+    gauges.update(pool_gauges(app))
+
+    def rows(samples):
+        return [[name, [list(label) for label in labels], value]
+                for (name, labels), value in samples.items()]
+
+    return {
+        'pid': os.getpid(),
+        'counters': rows({**shard.counters, **counters}),
+        'histograms': rows(shard.histograms),
+        'gauges': rows(gauges),
+    }
+
+
+def dump(app, directory):
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    partial = f'{path}.{threading.get_ident()}.tmp'
+    with open(partial, 'w') as f:
+        json.dump(snapshot(app), f)
+    os.replace(partial, path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load_snapshots(app, directory):
+    """This process's live totals plus the files of the other workers."""
+    snapshots = [snapshot(app)]
+    if directory:
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name[:-5] == str(os.getpid()):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # counters of exited workers still count; their gauges do not
+            if not process_alive(data['pid']):
+                data['gauges'] = []
+            snapshots.append(data)
+    return snapshots
+
+
+def aggregate(snapshots):
+    merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    for data in snapshots:
+        for kind, samples in merged.items():
+            for name, labels, value in data[kind]:
+                key = (name, tuple(tuple(label) for label in labels))
+                if kind == 'histograms':
+                    mine = samples.setdefault(key, [0] * len(value))
+                    for i, count in enumerate(value):
+                        mine[i] += count
+                else:
+                    samples[key] = samples.get(key, 0) + value
+
+    gauges, counters = merged['gauges'], merged['counters']
+    for (name, labels), capacity in list(gauges.items()):
+        if name == 'fyyur_db_pool_capacity' and capacity:
+            checked_out = gauges.get(('fyyur_db_pool_checked_out', labels), 0)
+            gauges['fyyur_db_pool_saturation', labels] = checked_out / capacity
+    lookups = (counters.get(('fyyur_cache_hits_total', ()), 0)
+               + counters.get(('fyyur_cache_misses_total', ()), 0))
+    if lookups:
+        gauges['fyyur_cache_hit_ratio', ()] = (
+            counters[('fyyur_cache_hits_total', ())] / lookups)
+    return merged
+
+
+#----------------------------------------------------------------------------#
+# Exposition.
+#----------------------------------------------------------------------------#
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels) + '}'
+
+
+def exposition(merged):
+    def ordered(kind):
+        return sorted(merged[kind].items(), key=lambda item: str(item[0]))
+
+    samples = {}
+    for kind in ('counters', 'gauges'):
+        for (name, labels), value in ordered(kind):
+            samples.setdefault(name, []).append(
+                f'{name}{format_labels(labels)} {value}')
+    for (name, labels), histogram in ordered('histograms'):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram[:-1]):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} '
+                         f'{cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {histogram[-1]}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    output = []
+    for name in sorted(samples):
+        kind, description = METRICS[name]
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(samples[name])
+    return '\n'.join(output) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Flask integration.
+#----------------------------------------------------------------------------#
+
+
+def init_metrics(app):
+    directory = app.config.get('METRICS_DIR')
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+    flushed_at = [time.monotonic()]
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started_at', None)
+        if started is None:
+            return response
+        # unmatched URLs share one label instead of one series per path
+        endpoint = request.endpoint or 'unmatched'
+        shard = registry.shard()
+        shard.observe('fyyur_http_request_duration_seconds',
+                      (('endpoint', endpoint), ('method', request.method)),
+                      time.perf_counter() - started)
+        shard.inc('fyyur_http_responses_total',
+                  (('endpoint', endpoint), ('method', request.method),
+                   ('status', response.status_code)))
+
+        if directory and time.monotonic() - flushed_at[0] >= interval:
+            flushed_at[0] = time.monotonic()
+            dump(app, directory)
+        return response
+
+    if signals_available:
+        def template_started(sender, template, context, **extra):
+            g.setdefault('template_started_at', []).append(time.perf_counter())
+
+        def template_finished(sender, template, context, **extra):
+            started = g.get('template_started_at')
+            if started:
+                registry.shard().observe(
+                    'fyyur_template_render_seconds',
+                    (('template', template.name or 'string'),),
+                    time.perf_counter() - started.pop())
+
+        before_render_template.connect(template_started, app, weak=False)
+        template_rendered.connect(template_finished, app, weak=False)
+    else:
+        app.logger.warning('blinker is not installed; template render '
+                           'times are not recorded')
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(dump, app, directory)
+
+    @app.route('/metrics')
+    def metrics():
+        merged = aggregate(load_snapshots(app, directory))
+        return Response(exposition(merged),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    app.extensions['metrics'] = registry
+    return registry
@@ -0,0 +1,28 @@
+"""show duration
+
+Revision ID: 06b20fe4da54
+Revises: 94c06bd001a0
+Create Date: 2026-10-18 16:41:09.570233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '06b20fe4da54'
+down_revision = '94c06bd001a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('show', sa.Column('duration_minutes', sa.Integer(),
+                                    server_default='120', nullable=False))
+    op.create_check_constraint('ck_show_duration_minutes', 'show',
+                               'duration_minutes BETWEEN 1 AND 1440')
+
+
+def downgrade():
+    op.drop_constraint('ck_show_duration_minutes', 'show', type_='check')
+    op.drop_column('show', 'duration_minutes')
@@ -0,0 +1,33 @@
+"""import checkpoint
+
+Revision ID: 1b637c4565fd
+Revises: 82cc1f4a846b
+Create Date: 2026-10-18 13:20:41.508116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b637c4565fd'
+down_revision = '82cc1f4a846b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'import_checkpoint',
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('rows_done', sa.Integer(), nullable=False),
+        sa.Column('inserted', sa.Integer(), nullable=False),
+        sa.Column('rejected', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade():
+    op.drop_table('import_checkpoint')
@@ -0,0 +1,29 @@
+"""genre indexes
+
+Revision ID: 3c7a9e51d2b8
+Revises: 06b20fe4da54
+Create Date: 2026-10-18 18:02:37.114529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7a9e51d2b8'
+down_revision = '06b20fe4da54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # array_ops: genres && :genres and genres @> :genres
+    op.create_index('ix_venue_genres', 'venue', ['genres'],
+                    postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'artist', ['genres'],
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='artist')
+    op.drop_index('ix_venue_genres', table_name='venue')
@@ -0,0 +1,49 @@
+"""recommendations
+
+Revision ID: 5e2d8f0b7a41
+Revises: 3c7a9e51d2b8
+Create Date: 2026-10-18 19:26:50.318042
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2d8f0b7a41'
+down_revision = '3c7a9e51d2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'recommendation',
+        sa.Column('kind', sa.String(length=6), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('kind', 'artist_id', 'venue_id')
+    )
+    op.create_index('ix_recommendation_kind_venue_id', 'recommendation',
+                    ['kind', 'venue_id'])
+    op.create_table(
+        'recommendation_stale',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=6), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # every venue and artist starts stale: the first refresh fills the lists
+    op.execute("INSERT INTO recommendation_stale (kind, entity_id) "
+               "SELECT 'venue', id FROM venue")
+    op.execute("INSERT INTO recommendation_stale (kind, entity_id) "
+               "SELECT 'artist', id FROM artist")
+
+
+def downgrade():
+    op.drop_table('recommendation_stale')
+    op.drop_index('ix_recommendation_kind_venue_id', table_name='recommendation')
+    op.drop_table('recommendation')
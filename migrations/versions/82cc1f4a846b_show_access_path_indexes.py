@@ -0,0 +1,35 @@
+"""show access path indexes
+
+Revision ID: 82cc1f4a846b
+Revises: 8e9e572cf91b
+Create Date: 2026-10-18 11:48:05.219843
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '82cc1f4a846b'
+down_revision = '8e9e572cf91b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # backref loads and past/upcoming splits per venue and artist
+    op.create_index('ix_show_venue_id_start_time', 'show',
+                    ['venue_id', 'start_time'])
+    op.create_index('ix_show_artist_id_start_time', 'show',
+                    ['artist_id', 'start_time'])
+    # /shows keyset pagination and counter rollover windows
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'])
+    # /venues city/state buckets
+    op.create_index('ix_venue_state_city', 'venue', ['state', 'city', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_venue_state_city', table_name='venue')
+    op.drop_index('ix_show_start_time_id', table_name='show')
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
@@ -0,0 +1,38 @@
+"""show counters
+
+Revision ID: 8e9e572cf91b
+Revises: fdd82f190d8c
+Create Date: 2026-10-18 11:02:17.845330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e9e572cf91b'
+down_revision = 'fdd82f190d8c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, key in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        # backfill; start_time is a local timestamp, as in the app
+        op.execute(
+            f'UPDATE {table} SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM show '
+            f'WHERE show.{key} = {table}.id AND show.start_time > LOCALTIMESTAMP), '
+            f'past_shows_count = (SELECT count(*) FROM show '
+            f'WHERE show.{key} = {table}.id AND show.start_time <= LOCALTIMESTAMP)'
+        )
+
+
+def downgrade():
+    for table in ('venue', 'artist'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
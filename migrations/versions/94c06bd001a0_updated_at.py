@@ -0,0 +1,28 @@
+"""updated_at
+
+Revision ID: 94c06bd001a0
+Revises: 1b637c4565fd
+Create Date: 2026-10-18 15:02:36.218904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '94c06bd001a0'
+down_revision = '1b637c4565fd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows start out as updated now
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       server_default=sa.func.now(), nullable=False))
+
+
+def downgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,44 @@
+"""trigram search indexes
+
+Revision ID: fdd82f190d8c
+Revises: 21dce57edf16
+Create Date: 2026-10-18 10:12:41.503214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fdd82f190d8c'
+down_revision = '21dce57edf16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # array_to_string() is only STABLE, so genres need an IMMUTABLE wrapper
+    # before they can be used in an expression index
+    op.execute(
+        "CREATE OR REPLACE FUNCTION fyyur_genres_text(varchar[]) "
+        "RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE "
+        "AS $$ SELECT array_to_string($1, ' ') $$"
+    )
+    for table in ('venue', 'artist'):
+        for column in ('name', 'city', 'state'):
+            op.execute(
+                f'CREATE INDEX ix_{table}_{column}_trgm ON {table} '
+                f'USING gin ({column} gin_trgm_ops)'
+            )
+        op.execute(
+            f'CREATE INDEX ix_{table}_genres_trgm ON {table} '
+            f'USING gin (fyyur_genres_text(genres) gin_trgm_ops)'
+        )
+
+
+def downgrade():
+    for table in ('venue', 'artist'):
+        for column in ('name', 'city', 'state', 'genres'):
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_{column}_trgm')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_genres_text(varchar[])')
@@ -1,16 +1,98 @@
-from flask_sqlalchemy import SQLAlchemy
+from flask import current_app
 from flask_migrate import Migrate
-from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from sqlalchemy import event, orm
+from replicas import RoutingSQLAlchemy, init_replicas
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+# show lengths, in minutes; the cap bounds how far back an overlapping
+# show can start (bookings.py)
+SHOW_DEFAULT_MINUTES = 120
+SHOW_MAX_MINUTES = 24 * 60
 
 
 def db_init(app):
     db.init_app(app)
     Migrate(app, db)
+    init_replicas(app, db)
     return db
 
 
+def trigram_indexes(table, *columns):
+    # pg_trgm GIN indexes of fdd82f190d8c, declared so autogenerate keeps
+    # them; the genres one is an expression index, which it skips anyway
+    return tuple(db.Index(f'ix_{table}_{column}_trgm', column,
+                          postgresql_using='gin',
+                          postgresql_ops={column: 'gin_trgm_ops'})
+                 for column in columns)
+
+
+def after_commit(target, callback):
+    # callback() runs once the session that flushed `target` commits, and is
+    # dropped if it rolls back: in-memory indexes fed from mapper events must
+    # not show writes that never happened
+    session = orm.object_session(target)
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+@event.listens_for(orm.Session, 'after_commit')
+def run_after_commit(session):
+    for callback in session.info.pop('after_commit', ()):
+        callback()
+
+
+@event.listens_for(orm.Session, 'after_rollback')
+def drop_after_commit(session):
+    session.info.pop('after_commit', None)
+
+
+def encode_cursor(start_time, show_id):
+    raw = f'{start_time.isoformat()}|{show_id}'
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # raises ValueError on anything that was not produced by encode_cursor
+    try:
+        raw = urlsafe_b64decode(cursor.encode()).decode()
+        start_time, show_id = raw.split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError(f'invalid cursor: {cursor!r}') from e
+
+
+def split_shows(shows, now=None):
+    # (past, upcoming) show dicts, split on their start_time
+    now = now or datetime.today()
+    past_shows = []
+    upcoming_shows = []
+    for show in shows:
+        if show["start_time"] <= now:
+            past_shows.append(show)
+        else:
+            upcoming_shows.append(show)
+    return past_shows, upcoming_shows
+
+
+def detail_version(model, show_key, counterpart, counterpart_key, entity_id,
+                   now=None):
+    # everything a venue or artist page depends on: the row, its shows and
+    # their counterparts, and how many of the shows have started; None if
+    # there is no such row
+    now = now or datetime.today()
+    query = db.session.query(
+        model.updated_at,
+        db.func.max(Show.updated_at),
+        db.func.max(counterpart.updated_at),
+        db.func.count(Show.id),
+        db.func.count(db.case([(Show.start_time <= now, Show.id)])),
+    ).outerjoin(Show, show_key == model.id
+                ).outerjoin(counterpart, counterpart.id == counterpart_key)
+    return query.filter(model.id == entity_id).group_by(model.id).first()
+
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
@@ -18,6 +100,11 @@ def db_init(app):
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city', 'state', 'city', 'id'),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        *trigram_indexes('venue', 'name', 'city', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -30,66 +117,107 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(255), default='')
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(db.ARRAY(db.String).with_variant(db.JSON, 'sqlite'),
+                       nullable=False)
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False,
+                                     default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False,
+                                 default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.today,
+                           onupdate=datetime.today, server_default=db.func.now())
+
+    @classmethod
+    def get_with_shows(cls, venue_id):
+        # venue, its shows and their artists in two queries whatever the
+        # number of shows
+        return cls.query.options(
+            db.selectinload(cls.shows).joinedload(Show.artist)
+        ).get(venue_id)
+
+    @classmethod
+    def version(cls, venue_id):
+        return detail_version(cls, Show.venue_id, Artist, Show.artist_id, venue_id)
 
     def venue_data(self):
-        upcoming_shows = self.get_upcoming_shows()
-        past_shows = self.get_past_shows()
+        return self.detail_data(self, *self.get_shows())
+
+    @staticmethod
+    def detail_data(venue, past_shows, upcoming_shows):
+        # venue is anything with the column attributes, not only a Venue
         return {
-            "id": self.id,
-            "name": self.name,
-            "genres": self.genres,
-            "address": self.address,
-            "city": self.city,
-            "state": self.state,
-            "phone": self.phone,
-            "website": self.website_link,
-            "facebook_link": self.facebook_link,
-            "seeking_talent": self.seeking_talent,
-            "seeking_description": self.seeking_description,
-            "image_link": self.image_link,
+            "id": venue.id,
+            "name": venue.name,
+            "genres": venue.genres,
+            "address": venue.address,
+            "city": venue.city,
+            "state": venue.state,
+            "phone": venue.phone,
+            "website": venue.website_link,
+            "facebook_link": venue.facebook_link,
+            "seeking_talent": venue.seeking_talent,
+            "seeking_description": venue.seeking_description,
+            "image_link": venue.image_link,
             "past_shows": past_shows,
             "upcoming_shows": upcoming_shows,
             "past_shows_count": len(past_shows),
             "upcoming_shows_count": len(upcoming_shows),
         }
 
+    def get_shows(self):
+        return split_shows({
+            "artist_id": show.artist_id,
+            "artist_name": show.artist.name,
+            "artist_image_link": show.artist.image_link,
+            "start_time": show.start_time
+        } for show in self.shows)
+
     def get_past_shows(self):
-        past_shows = []
-        today_time = datetime.today()
-        for show in self.shows:
-            if show.start_time <= today_time:
-                past_shows.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "start_time": str(show.start_time)
-                })
-        return past_shows
+        return self.get_shows()[0]
 
     def get_upcoming_shows(self):
-        upcoming_shows = []
-        today_time = datetime.today()
-        for show in self.shows:
-            if show.start_time > today_time:
-                upcoming_shows.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "start_time": str(show.start_time)
-                })
-        return upcoming_shows
+        return self.get_shows()[1]
 
-    def search_result(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "num_upcoming_shows": len(self.get_upcoming_shows())
-        }
+    @classmethod
+    def search(cls, term, limit=50, with_total=False):
+        return current_app.extensions['search'].search(
+            cls, term, limit, with_total)
+
+    @classmethod
+    def get_areas(cls):
+        # one query over the venue table alone, ordered so that city/state
+        # buckets can be built in a single pass
+        rows = db.session.query(
+            cls.city, cls.state, cls.id, cls.name, cls.upcoming_shows_count
+        ).order_by(cls.state, cls.city, cls.id).all()
+        return cls.build_areas(rows)
+
+    @staticmethod
+    def build_areas(rows):
+        # rows of (city, state, id, name, upcoming_shows_count) sorted by
+        # state and city
+        areas = []
+        for city, state, venue_id, name, num_upcoming_shows in rows:
+            if not areas or (areas[-1]["city"], areas[-1]["state"]) != (city, state):
+                areas.append({
+                    "city": city,
+                    "state": state,
+                    "venues": []
+                })
+            areas[-1]["venues"].append({
+                "id": venue_id,
+                "name": name,
+                "num_upcoming_shows": num_upcoming_shows
+            })
+        return areas
 
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        *trigram_indexes('artist', 'name', 'city', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -101,73 +229,90 @@ class Artist(db.Model):
     image_link = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(255), default='')
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(db.ARRAY(db.String).with_variant(db.JSON, 'sqlite'),
+                       nullable=False)
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False,
+                                     default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False,
+                                 default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.today,
+                           onupdate=datetime.today, server_default=db.func.now())
+
+    @classmethod
+    def get_with_shows(cls, artist_id):
+        # artist, its shows and their venues in two queries whatever the
+        # number of shows
+        return cls.query.options(
+            db.selectinload(cls.shows).joinedload(Show.venue)
+        ).get(artist_id)
+
+    @classmethod
+    def version(cls, artist_id):
+        return detail_version(cls, Show.artist_id, Venue, Show.venue_id, artist_id)
 
     def artist_data(self):
-        upcoming_shows = self.get_upcoming_shows()
-        past_shows = self.get_past_shows()
+        return self.detail_data(self, *self.get_shows())
+
+    @staticmethod
+    def detail_data(artist, past_shows, upcoming_shows):
+        # artist is anything with the column attributes, not only an Artist
         return {
-            "id": self.id,
-            "name": self.name,
-            "genres": self.genres,
-            "city": self.city,
-            "state": self.state,
-            "phone": self.phone,
-            "website": self.website_link,
-            "facebook_link": self.facebook_link,
-            "seeking_venue": self.seeking_venue,
-            "seeking_description": self.seeking_description,
-            "image_link": self.image_link,
+            "id": artist.id,
+            "name": artist.name,
+            "genres": artist.genres,
+            "city": artist.city,
+            "state": artist.state,
+            "phone": artist.phone,
+            "website": artist.website_link,
+            "facebook_link": artist.facebook_link,
+            "seeking_venue": artist.seeking_venue,
+            "seeking_description": artist.seeking_description,
+            "image_link": artist.image_link,
             "past_shows": past_shows,
             "upcoming_shows": upcoming_shows,
             "past_shows_count": len(past_shows),
             "upcoming_shows_count": len(upcoming_shows),
         }
 
+    def get_shows(self):
+        return split_shows({
+            "artist_id": self.id,
+            "artist_name": self.name,
+            "artist_image_link": self.image_link,
+            "venue_id": show.venue_id,
+            "venue_name": show.venue.name,
+            "venue_image_link": show.venue.image_link,
+            "start_time": show.start_time
+        } for show in self.shows)
+
     def get_past_shows(self):
-        past_shows = []
-        today_time = datetime.today()
-        for show in self.shows:
-            if show.start_time <= today_time:
-                past_shows.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "venue_id": show.venue_id,
-                    "venue_name": show.venue.name,
-                    "venue_image_link": show.venue.image_link,
-                    "start_time": str(show.start_time)
-                })
-        return past_shows
+        return self.get_shows()[0]
 
     def get_upcoming_shows(self):
-        upcoming_shows = []
-        today_time = datetime.today()
-        for show in self.shows:
-            if show.start_time > today_time:
-                upcoming_shows.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "venue_id": show.venue_id,
-                    "venue_name": show.venue.name,
-                    "venue_image_link": show.venue.image_link,
-                    "start_time": str(show.start_time)
-                })
-        return upcoming_shows
+        return self.get_shows()[1]
 
-    def search_result(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "num_upcoming_shows": len(self.get_upcoming_shows())
-        }
+    @classmethod
+    def search(cls, term, limit=50, with_total=False):
+        return current_app.extensions['search'].search(
+            cls, term, limit, with_total)
 
 
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint(
+            f'duration_minutes BETWEEN 1 AND {SHOW_MAX_MINUTES}',
+            name='ck_show_duration_minutes'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False,
+                                 default=SHOW_DEFAULT_MINUTES,
+                                 server_default=str(SHOW_DEFAULT_MINUTES))
     artist = db.relationship('Artist',
                              backref=db.backref('shows', cascade="all, delete"), lazy=True)
     venue = db.relationship('Venue',
@@ -177,6 +322,12 @@ class Show(db.Model):
         'artist.id'), nullable=False)
     venue_id = db.Column(
         db.Integer, db.ForeignKey('venue.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.today,
+                           onupdate=datetime.today, server_default=db.func.now())
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration_minutes)
 
     def show_data(self):
         return {
@@ -185,5 +336,109 @@ class Show(db.Model):
             "artist_id": self.artist_id,
             "artist_name": self.artist.name,
             "artist_image_link": self.artist.image_link,
-            "start_time": str(self.start_time)
+            "start_time": self.start_time
+        }
+
+    @classmethod
+    def listing_query(cls):
+        # joined projection of only the columns a show tile renders
+        return db.session.query(
+            cls.id, cls.start_time,
+            cls.venue_id, Venue.name.label('venue_name'),
+            cls.artist_id, Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')
+        ).join(Venue, cls.venue_id == Venue.id
+               ).join(Artist, cls.artist_id == Artist.id)
+
+    @staticmethod
+    def listing_data(row):
+        return {
+            "id": row.id,
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time
+        }
+
+    @classmethod
+    def get_page(cls, after=None, before=None, per_page=30):
+        # keyset pagination on (start_time, id)
+        key = db.tuple_(cls.start_time, cls.id)
+        query = cls.listing_query()
+
+        if before:
+            query = query.filter(key < decode_cursor(before)).order_by(
+                cls.start_time.desc(), cls.id.desc())
+        else:
+            if after:
+                query = query.filter(key > decode_cursor(after))
+            query = query.order_by(cls.start_time, cls.id)
+
+        rows = query.limit(per_page + 1).all()
+        return cls.page_data(rows, after, before, per_page)
+
+    @classmethod
+    def page_data(cls, rows, after, before, per_page):
+        # rows: up to per_page + 1 listing rows in query order
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before:
+            rows.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, bool(after)
+
+        shows = [cls.listing_data(row) for row in rows]
+
+        next_cursor = prev_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+        if rows and has_prev:
+            prev_cursor = encode_cursor(rows[0].start_time, rows[0].id)
+
+        return {
+            "shows": shows,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
         }
+
+
+class ImportCheckpoint(db.Model):
+    # progress of `flask import`, committed together with each batch
+    __tablename__ = 'import_checkpoint'
+
+    source = db.Column(db.String, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    inserted = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.today)
+
+
+class Recommendation(db.Model):
+    # precomputed top lists of recommendations.py; kind 'venue' rows list
+    # the venues recommended to artist_id, kind 'artist' rows the artists
+    # recommended to venue_id
+    __tablename__ = 'recommendation'
+    __table_args__ = (
+        db.Index('ix_recommendation_kind_venue_id', 'kind', 'venue_id'),
+    )
+
+    kind = db.Column(db.String(6), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'),
+                          primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'),
+                         primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+
+class RecommendationStale(db.Model):
+    # venues and artists whose top list needs recomputing, written in the
+    # transaction of the change and consumed by `flask recommendations refresh`
+    __tablename__ = 'recommendation_stale'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(6), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
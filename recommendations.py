@@ -0,0 +1,356 @@
+import heapq
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+
+from models import db, Venue, Artist, Show, Recommendation, RecommendationStale
+
+
+#----------------------------------------------------------------------------#
+# Artist-venue recommendations.
+#
+# A pair scores on genre overlap (Jaccard), locality (same city, or same
+# state at half weight), show history and whether both sides are seeking,
+# weighted by RECOMMENDATION_WEIGHTS. Show history follows the co-booking
+# graph: an artist's peers are the artists who played any of its venues,
+# and a venue scores by the share of its artists who are peers. Pairs that
+# already have a show are not recommended.
+#
+# The catalog is held as bitmaps (Python ints): per venue the artists who
+# played it, per artist its venues, per genre its venues and its artists.
+# Peers, candidates and overlaps are then ORs, ANDs and popcounts over
+# whole rows at once, and only candidates sharing a genre or a peer are
+# scored. Each venue's and artist's top RECOMMENDATIONS_TOP_N are stored in
+# the recommendation table.
+#
+# Writes to shows and to venue and artist profiles mark the entities
+# involved stale in the same transaction; `flask recommendations refresh`
+# (run it from cron) recomputes their lists, the lists that name them and
+# the lists they are a candidate for, which they may have just entered.
+# Further ripples through the co-booking graph wait for a `--full` refresh.
+#----------------------------------------------------------------------------#
+
+
+DEFAULT_WEIGHTS = {'genre': 0.5, 'locality': 0.2, 'history': 0.2, 'seeking': 0.1}
+
+PROFILE = ('genres', 'city', 'state')
+SEEKING = {Venue: 'seeking_talent', Artist: 'seeking_venue'}
+
+
+def popcount(bitmap):
+    return bitmap.bit_count()
+
+
+def positions(bitmap):
+    bits = bin(bitmap)[:1:-1]
+    found, position = [], bits.find('1')
+    while position != -1:
+        found.append(position)
+        position = bits.find('1', position + 1)
+    return found
+
+
+class Catalog:
+    """Venues, artists and who played where, as bitmaps over positions."""
+
+    def __init__(self, venues, artists, bookings, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        genre_bits = {}
+        self.venues = self.side(venues, genre_bits)
+        self.artists = self.side(artists, genre_bits)
+        self.genre_names = {bit: genre for genre, bit in genre_bits.items()}
+        self.venue_artists = [0] * len(self.venues['ids'])
+        self.artist_venues = [0] * len(self.artists['ids'])
+        for artist_id, venue_id in bookings:
+            a = self.artists['positions'].get(artist_id)
+            v = self.venues['positions'].get(venue_id)
+            if a is not None and v is not None:
+                self.venue_artists[v] |= 1 << a
+                self.artist_venues[a] |= 1 << v
+        self.played_counts = [popcount(played) for played in self.venue_artists]
+        self.peers = {}
+
+    @staticmethod
+    def side(rows, genre_bits):
+        side = {'ids': [], 'positions': {}, 'genres': [], 'genre_counts': [],
+                'places': [], 'seeking': [], 'by_genre': {}}
+        for position, (entity_id, genres, city, state, seeking) in enumerate(rows):
+            mask = 0
+            for genre in set(genres or ()):
+                mask |= 1 << genre_bits.setdefault(genre, len(genre_bits))
+                side['by_genre'][genre] = side['by_genre'].get(genre, 0) | 1 << position
+            side['ids'].append(entity_id)
+            side['positions'][entity_id] = position
+            side['genres'].append(mask)
+            side['genre_counts'].append(popcount(mask))
+            side['places'].append((city, state))
+            side['seeking'].append(bool(seeking))
+        return side
+
+    @classmethod
+    def load(cls, weights=None):
+        def rows(model):
+            return db.session.query(
+                model.id, model.genres, model.city, model.state,
+                getattr(model, SEEKING[model])).order_by(model.id).all()
+        bookings = db.session.query(Show.artist_id, Show.venue_id).distinct().all()
+        return cls(rows(Venue), rows(Artist), bookings, weights)
+
+    def artist_peers(self, a):
+        if a not in self.peers:
+            peers = 0
+            for v in positions(self.artist_venues[a]):
+                peers |= self.venue_artists[v]
+            self.peers[a] = peers & ~(1 << a)
+        return self.peers[a]
+
+    def score(self, a, v):
+        weights, artists, venues = self.weights, self.artists, self.venues
+        shared = popcount(artists['genres'][a] & venues['genres'][v])
+        union = artists['genre_counts'][a] + venues['genre_counts'][v] - shared
+        genre = shared / union if union else 0.0
+        (artist_city, artist_state), (venue_city, venue_state) = (
+            artists['places'][a], venues['places'][v])
+        locality = (0.0 if artist_state != venue_state
+                    else 1.0 if artist_city == venue_city else 0.5)
+        played = self.played_counts[v]
+        history = (popcount(self.venue_artists[v] & self.artist_peers(a)) / played
+                   if played else 0.0)
+        seeking = (artists['seeking'][a] + venues['seeking'][v]) / 2
+        return (weights['genre'] * genre + weights['locality'] * locality
+                + weights['history'] * history + weights['seeking'] * seeking)
+
+    def genre_mates(self, mask, other):
+        mates = 0
+        for bit in positions(mask):
+            mates |= other['by_genre'].get(self.genre_names[bit], 0)
+        return mates
+
+    def venue_candidates(self, a):
+        # venues sharing a genre with the artist or played by one of its
+        # peers; also the venues whose candidates include the artist
+        candidates = self.genre_mates(self.artists['genres'][a], self.venues)
+        for peer in positions(self.artist_peers(a)):
+            candidates |= self.artist_venues[peer]
+        return candidates & ~self.artist_venues[a]
+
+    def artist_candidates(self, v):
+        # artists sharing a genre with the venue or who shared a venue with
+        # one of its artists; also the artists whose candidates include it
+        candidates = self.genre_mates(self.venues['genres'][v], self.artists)
+        neighbours = 0
+        for artist in positions(self.venue_artists[v]):
+            neighbours |= self.artist_venues[artist]
+        for venue in positions(neighbours):
+            candidates |= self.venue_artists[venue]
+        return candidates & ~self.venue_artists[v]
+
+    def venues_for(self, artist_id, n):
+        """[(venue_id, score)] best first, for a known artist."""
+        a = self.artists['positions'][artist_id]
+        # ties go to the older venue
+        scored = ((self.score(a, v), -v)
+                  for v in positions(self.venue_candidates(a)))
+        return [(self.venues['ids'][-negated], score)
+                for score, negated in heapq.nlargest(n, scored)]
+
+    def artists_for(self, venue_id, n):
+        """[(artist_id, score)] best first, for a known venue."""
+        v = self.venues['positions'][venue_id]
+        scored = ((self.score(a, v), -a)
+                  for a in positions(self.artist_candidates(v)))
+        return [(self.artists['ids'][-negated], score)
+                for score, negated in heapq.nlargest(n, scored)]
+
+    def reached_by(self, artist_ids, venue_ids):
+        """(venue ids, artist ids) of the lists that `artist_ids` and
+        `venue_ids` are candidates for."""
+        artists, venues = self.artists, self.venues
+        reached_venues = reached_artists = 0
+        for artist_id in artist_ids & artists['positions'].keys():
+            reached_venues |= self.venue_candidates(artists['positions'][artist_id])
+        for venue_id in venue_ids & venues['positions'].keys():
+            reached_artists |= self.artist_candidates(venues['positions'][venue_id])
+        return ({venues['ids'][v] for v in positions(reached_venues)},
+                {artists['ids'][a] for a in positions(reached_artists)})
+
+
+#----------------------------------------------------------------------------#
+# Stale marks.
+#----------------------------------------------------------------------------#
+
+
+def mark_stale(connection, *entities):
+    # (kind, id) pairs, written in the transaction of the change
+    rows = [{'kind': kind, 'entity_id': entity_id}
+            for kind, entity_id in entities if entity_id is not None]
+    if rows:
+        connection.execute(RecommendationStale.__table__.insert(), rows)
+
+
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_delete')
+def show_written(mapper, connection, target):
+    mark_stale(connection, ('venue', target.venue_id), ('artist', target.artist_id))
+
+
+@event.listens_for(Show, 'after_update')
+def show_updated(mapper, connection, target):
+    # a show moved to another venue or artist; a new time changes nothing
+    state = inspect(target)
+    entities = []
+    for kind in ('venue', 'artist'):
+        history = state.attrs[f'{kind}_id'].history
+        if history.deleted:
+            entities += [('venue', target.venue_id), ('artist', target.artist_id),
+                         (kind, history.deleted[0])]
+    mark_stale(connection, *entities)
+
+
+def profile_inserted(kind):
+    def inserted(mapper, connection, target):
+        mark_stale(connection, (kind, target.id))
+    return inserted
+
+
+def profile_updated(kind, model):
+    def updated(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[attr].history.has_changes()
+               for attr in (*PROFILE, SEEKING[model])):
+            mark_stale(connection, (kind, target.id))
+    return updated
+
+
+def profile_deleted(kind, listed_by):
+    # the rows naming it go with it (ON DELETE CASCADE): their owners' lists
+    # are one short until recomputed
+    table = Recommendation.__table__
+    owner = table.c.artist_id if listed_by == 'artist' else table.c.venue_id
+
+    def deleted(mapper, connection, target):
+        connection.execute(RecommendationStale.__table__.insert().from_select(
+            ['kind', 'entity_id'], db.select([db.literal(listed_by), owner]).where(
+                db.and_(table.c.kind == kind, table.c[f'{kind}_id'] == target.id))))
+    return deleted
+
+
+for kind, model, other in (('venue', Venue, 'artist'), ('artist', Artist, 'venue')):
+    event.listen(model, 'after_insert', profile_inserted(kind))
+    event.listen(model, 'after_update', profile_updated(kind, model))
+    event.listen(model, 'before_delete', profile_deleted(kind, other))
+
+
+#----------------------------------------------------------------------------#
+# Refresh.
+#----------------------------------------------------------------------------#
+
+
+def chunks(values, size=1000):
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def listed_with(kind, ids):
+    # owners of the stored lists that name one of `ids`
+    table = Recommendation.__table__
+    named = table.c.venue_id if kind == 'venue' else table.c.artist_id
+    owner = table.c.artist_id if kind == 'venue' else table.c.venue_id
+    owners = set()
+    for chunk in chunks(ids):
+        owners.update(owner_id for owner_id, in db.session.execute(
+            db.select([owner]).where(db.and_(table.c.kind == kind, named.in_(chunk)))))
+    return owners
+
+
+def refresh(full=False, top_n=10, weights=None):
+    """Recompute the stale top lists, or all of them; (artists, venues)
+    recomputed."""
+    table = Recommendation.__table__
+    stale = RecommendationStale.__table__
+    last = db.session.query(db.func.max(RecommendationStale.id)).scalar()
+    catalog = Catalog.load(weights)
+
+    if full:
+        artist_ids, venue_ids = set(catalog.artists['ids']), set(catalog.venues['ids'])
+        db.session.execute(table.delete())
+    else:
+        marks = db.session.query(RecommendationStale.kind,
+                                 RecommendationStale.entity_id).filter(
+            RecommendationStale.id <= (last or 0)).distinct().all()
+        artist_ids = {entity_id for kind, entity_id in marks if kind == 'artist'}
+        venue_ids = {entity_id for kind, entity_id in marks if kind == 'venue'}
+        # a changed entity scores differently in the lists that name it, and
+        # may now belong in the lists it is a candidate for
+        reached_venues, reached_artists = catalog.reached_by(artist_ids, venue_ids)
+        artist_ids, venue_ids = (
+            artist_ids | listed_with('venue', venue_ids) | reached_artists,
+            venue_ids | listed_with('artist', artist_ids) | reached_venues)
+        for chunk in chunks(artist_ids):
+            db.session.execute(table.delete().where(db.and_(
+                table.c.kind == 'venue', table.c.artist_id.in_(chunk))))
+        for chunk in chunks(venue_ids):
+            db.session.execute(table.delete().where(db.and_(
+                table.c.kind == 'artist', table.c.venue_id.in_(chunk))))
+
+    # deleted since they were marked
+    artist_ids &= catalog.artists['positions'].keys()
+    venue_ids &= catalog.venues['positions'].keys()
+    rows = [{'kind': 'venue', 'artist_id': artist_id, 'venue_id': venue_id,
+             'score': score}
+            for artist_id in artist_ids
+            for venue_id, score in catalog.venues_for(artist_id, top_n)]
+    rows += [{'kind': 'artist', 'artist_id': artist_id, 'venue_id': venue_id,
+              'score': score}
+             for venue_id in venue_ids
+             for artist_id, score in catalog.artists_for(venue_id, top_n)]
+    for start in range(0, len(rows), 1000):
+        db.session.execute(table.insert(), rows[start:start + 1000])
+    if last is not None:
+        db.session.execute(stale.delete().where(stale.c.id <= last))
+    db.session.commit()
+    return len(artist_ids), len(venue_ids)
+
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+
+def recommended(kind, model, key, entity_id, limit):
+    rows = db.session.query(
+        model.id, model.name, model.image_link, model.city, model.state,
+        Recommendation.score
+    ).join(Recommendation, getattr(Recommendation, f'{kind}_id') == model.id).filter(
+        Recommendation.kind == kind, key == entity_id
+    ).order_by(Recommendation.score.desc(), model.id).limit(limit)
+    return [row._asdict() for row in rows]
+
+
+def recommended_venues(artist_id, limit=5):
+    return recommended('venue', Venue, Recommendation.artist_id, artist_id, limit)
+
+
+def recommended_artists(venue_id, limit=5):
+    return recommended('artist', Artist, Recommendation.venue_id, venue_id, limit)
+
+
+def init_recommendations(app):
+    recommendations = AppGroup('recommendations',
+                               help='Maintain the artist-venue recommendations.')
+
+    @recommendations.command('refresh')
+    @click.option('--full', is_flag=True,
+                  help='Recompute every list, not only the stale ones.')
+    def refresh_command(full):
+        started = datetime.now()
+        artists, venues = refresh(
+            full, app.config.get('RECOMMENDATIONS_TOP_N', 10),
+            app.config.get('RECOMMENDATION_WEIGHTS'))
+        click.echo(f'recomputed {artists} artists and {venues} venues in '
+                   f'{(datetime.now() - started).total_seconds():.1f}s')
+
+    app.cli.add_command(recommendations)
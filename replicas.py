@@ -0,0 +1,130 @@
+import itertools
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm, text
+from sqlalchemy.exc import DBAPIError
+
+
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#
+# Requests with a safe method, and the read-only POST endpoints listed in
+# DB_REPLICA_ENDPOINTS, are served from one of the replica binds in
+# DB_REPLICA_BINDS, picked round-robin among those that passed their last
+# health check. Everything else uses the primary: other requests, flushes,
+# work outside a request (CLI, migrations), and the browser that wrote
+# something in the last DB_READ_AFTER_WRITE_SECONDS, so it sees its own
+# changes before the replicas have caught up.
+#----------------------------------------------------------------------------#
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Postgres standbys report how far their replay lags behind the primary; a
+# standby that has replayed everything it received is not lagging, however
+# old its last transaction is
+REPLICATION_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+          OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('db_replica') if has_request_context() else None
+        if replica is not None and not self._flushing:
+            db = current_app.extensions['sqlalchemy'].db
+            return db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class ReplicaSet:
+
+    def __init__(self, db, app, binds, check_interval=10, max_lag=5):
+        self.db = db
+        self.app = app
+        self.binds = list(binds)
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.turn = itertools.count()
+        self.checked_at = {}
+        self.healthy = {}
+
+    def check(self, bind):
+        engine = self.db.get_engine(self.app, bind=bind)
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'postgresql':
+                    lag = connection.execute(REPLICATION_LAG).scalar() or 0
+                    return lag <= self.max_lag
+                connection.execute(text('SELECT 1'))
+                return True
+        except DBAPIError:
+            self.app.logger.warning(f'replica {bind} failed its health check')
+            return False
+
+    def is_healthy(self, bind):
+        now = time.monotonic()
+        if now - self.checked_at.get(bind, float('-inf')) >= self.check_interval:
+            # claim the check before running it, so concurrent requests keep
+            # using the previous verdict instead of checking too
+            self.checked_at[bind] = now
+            self.healthy[bind] = self.check(bind)
+        return self.healthy.get(bind, False)
+
+    def choose(self):
+        """The next healthy replica bind, or None for the primary."""
+        start = next(self.turn)
+        for i in range(len(self.binds)):
+            bind = self.binds[(start + i) % len(self.binds)]
+            if self.is_healthy(bind):
+                return bind
+        return None
+
+    def stats(self):
+        return {bind: self.healthy.get(bind) for bind in self.binds}
+
+
+def init_replicas(app, db):
+    binds = app.config.get('DB_REPLICA_BINDS') or []
+    replicas = ReplicaSet(db, app, binds,
+                          app.config.get('DB_REPLICA_CHECK_INTERVAL', 10),
+                          app.config.get('DB_REPLICA_MAX_LAG', 5))
+    endpoints = set(app.config.get('DB_REPLICA_ENDPOINTS') or ())
+    window = app.config.get('DB_READ_AFTER_WRITE_SECONDS', 10)
+    app.extensions['replicas'] = replicas
+    if not binds:
+        return replicas
+
+    @app.before_request
+    def route_to_replica():
+        read_only = (request.method in SAFE_METHODS
+                     or request.endpoint in endpoints)
+        if read_only and session.get('db_primary_until', 0) < time.time():
+            g.db_replica = replicas.choose()
+
+    @app.after_request
+    def pin_to_primary(response):
+        if g.get('db_wrote'):
+            session['db_primary_until'] = time.time() + window
+        return response
+
+    return replicas
@@ -0,0 +1,248 @@
+import itertools
+from datetime import date, datetime, timedelta
+
+from flask import Response, abort, render_template, request, stream_with_context
+
+from models import db, Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Calendar.
+#
+# Shows are selected by half-open ranges [start, end) on start_time, which
+# the (start_time, id), (venue_id, start_time) and (artist_id, start_time)
+# indexes answer with a range scan, whether the calendar is for everything,
+# one venue or one artist; the city filter joins the venue of each show in
+# the range. The page groups the rows into one bucket per day; the per-day
+# counts come from a GROUP BY over the same range, so they stay exact when
+# the listed shows are capped at CALENDAR_MAX_SHOWS.
+#----------------------------------------------------------------------------#
+
+
+PRESETS = ('today', 'tomorrow', 'this-weekend', 'this-week', 'next-7-days',
+           'this-month')
+
+
+def month_range(year, month):
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def preset_range(name, today):
+    if name == 'today':
+        return today, today + timedelta(days=1)
+    if name == 'tomorrow':
+        return today + timedelta(days=1), today + timedelta(days=2)
+    if name == 'this-weekend':
+        # the coming Saturday and Sunday, or the current ones
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:
+            saturday = today - timedelta(days=1)
+        return saturday, saturday + timedelta(days=2)
+    if name == 'this-week':
+        monday = today - timedelta(days=today.weekday())
+        return monday, monday + timedelta(days=7)
+    if name == 'next-7-days':
+        return today, today + timedelta(days=7)
+    if name == 'this-month':
+        return month_range(today.year, today.month)
+    raise ValueError(f'unknown range: {name!r}')
+
+
+def parse_range(args, today=None, max_days=366):
+    """[start, end) dates from ?when=, ?month=YYYY-MM or ?from=&to= (to is
+    inclusive); raises ValueError on anything else."""
+    today = today or date.today()
+    try:
+        if args.get('month'):
+            year, month = (int(part) for part in args['month'].split('-'))
+            start, end = month_range(year, month)
+        elif args.get('from') or args.get('to'):
+            start = date.fromisoformat(args['from']) if args.get('from') else today
+            end = (date.fromisoformat(args['to']) if args.get('to') else start) \
+                + timedelta(days=1)
+        else:
+            start, end = preset_range(args.get('when') or 'next-7-days', today)
+    except OverflowError:
+        # a day past date.max
+        raise ValueError('the range ends after 9999-12-31')
+    if end <= start:
+        raise ValueError('the range ends before it starts')
+    if (end - start).days > max_days:
+        raise ValueError(f'ranges are limited to {max_days} days')
+    return start, end
+
+
+def as_datetime(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def filter_shows(query, start, end, venue_id=None, artist_id=None, city=None,
+                 state=None):
+    query = query.filter(Show.start_time >= as_datetime(start),
+                         Show.start_time < as_datetime(end))
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    return query
+
+
+def shows_between(start, end, limit=None, **filters):
+    query = filter_shows(Show.listing_query(), start, end, **filters)
+    query = query.order_by(Show.start_time, Show.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return [Show.listing_data(row) for row in query]
+
+
+def day_counts(start, end, **filters):
+    day = db.func.date(Show.start_time)
+    query = db.session.query(day, db.func.count(Show.id))
+    if filters.get('city') or filters.get('state'):
+        query = query.join(Venue, Show.venue_id == Venue.id)
+    query = filter_shows(query, start, end, **filters).group_by(day)
+    # SQLite returns the day as 'YYYY-MM-DD'
+    return {value if isinstance(value, date) else date.fromisoformat(value): count
+            for value, count in query}
+
+
+def calendar_days(start, end, shows, counts):
+    """One bucket per day of the range: date, number of shows, shows listed."""
+    by_day = {day: list(day_shows) for day, day_shows in itertools.groupby(
+        shows, key=lambda show: show['start_time'].date())}
+    return [{
+        "date": start + timedelta(days=offset),
+        "count": counts.get(start + timedelta(days=offset), 0),
+        "shows": by_day.get(start + timedelta(days=offset), []),
+    } for offset in range((end - start).days)]
+
+
+#----------------------------------------------------------------------------#
+# iCalendar feeds.
+#----------------------------------------------------------------------------#
+
+
+def ical_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def ical_line(line):
+    # lines longer than 75 octets are folded, continuation lines starting
+    # with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current = [], b''
+    for char in line:
+        size = len(char.encode('utf-8'))
+        if len(current) + size > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char.encode('utf-8')
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ical_time(value):
+    # start_time is local time without a zone: a floating time in iCalendar
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def feed_rows(key, entity_id, since, chunk_size=500):
+    """The entity's shows from `since` on, one short transaction per chunk."""
+    query = db.session.query(
+        Show.id, Show.start_time, Show.duration_minutes,
+        Artist.name.label('artist_name'),
+        Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+    ).join(Artist, Show.artist_id == Artist.id
+           ).join(Venue, Show.venue_id == Venue.id).filter(key == entity_id)
+    last = (since, 0)
+    while True:
+        # the plain start_time bound lets the index range scan start at last
+        rows = query.filter(Show.start_time >= last[0],
+                            db.tuple_(Show.start_time, Show.id) > last).order_by(
+            Show.start_time, Show.id).limit(chunk_size).all()
+        db.session.rollback()
+        if not rows:
+            return
+        yield from rows
+        last = (rows[-1].start_time, rows[-1].id)
+
+
+def ical_feed(name, rows, host):
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    yield ical_line('BEGIN:VCALENDAR')
+    yield ical_line('VERSION:2.0')
+    yield ical_line('PRODID:-//Fyyur//Shows//EN')
+    yield ical_line(f'X-WR-CALNAME:{ical_text(name)}')
+    for row in rows:
+        location = ', '.join(part for part in (row.address, row.city, row.state) if part)
+        yield ''.join(ical_line(line) for line in (
+            'BEGIN:VEVENT',
+            f'UID:show-{row.id}@{host}',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART:{ical_time(row.start_time)}',
+            f'DURATION:PT{row.duration_minutes}M',
+            f'SUMMARY:{ical_text(row.artist_name)} at {ical_text(row.venue_name)}',
+            f'LOCATION:{ical_text(location)}',
+            'END:VEVENT',
+        ))
+    yield ical_line('END:VCALENDAR')
+
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+
+def init_schedule(app):
+
+    @app.route('/calendar')
+    def calendar():
+        try:
+            start, end = parse_range(request.args,
+                                     max_days=app.config.get('CALENDAR_MAX_DAYS', 366))
+        except ValueError:
+            abort(400)
+        filters = {
+            'venue_id': request.args.get('venue_id', type=int),
+            'artist_id': request.args.get('artist_id', type=int),
+            'city': request.args.get('city'),
+            'state': request.args.get('state'),
+        }
+        limit = app.config.get('CALENDAR_MAX_SHOWS', 300)
+        shows = shows_between(start, end, limit=limit, **filters)
+        counts = day_counts(start, end, **filters)
+        return render_template(
+            'pages/calendar.html', days=calendar_days(start, end, shows, counts),
+            start=start, end=end - timedelta(days=1), total=sum(counts.values()),
+            listed=len(shows), filters={name: value for name, value
+                                        in filters.items() if value},
+            presets=PRESETS)
+
+    def feed(model, key, entity_id):
+        entity = db.session.query(model.name).filter(model.id == entity_id).first()
+        if entity is None:
+            abort(404)
+        since = as_datetime(date.today() - timedelta(
+            days=app.config.get('ICAL_PAST_DAYS', 30)))
+        rows = feed_rows(key, entity_id, since)
+        return Response(
+            stream_with_context(ical_feed(
+                f'{entity.name} | Fyyur', rows, request.host.split(':')[0])),
+            mimetype='text/calendar')
+
+    @app.route('/venues/<int:venue_id>/calendar.ics')
+    def venue_calendar(venue_id):
+        return feed(Venue, Show.venue_id, venue_id)
+
+    @app.route('/artists/<int:artist_id>/calendar.ics')
+    def artist_calendar(artist_id):
+        return feed(Artist, Show.artist_id, artist_id)
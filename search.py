@@ -0,0 +1,223 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+
+from models import db, Venue, Artist, after_commit
+
+
+#----------------------------------------------------------------------------#
+# Search backends.
+#
+# Both backends match the term against name, city, state and genres and rank
+# by trigram similarity. They return the {"count", "data"} shape rendered by
+# the search templates, "data" carrying id, name and num_upcoming_shows.
+#----------------------------------------------------------------------------#
+
+
+def upcoming_counts_query(model):
+    # reads the counters maintained by counters.py, not the show table
+    return db.session.query(model.id, model.name, model.upcoming_shows_count)
+
+
+def search_result(rows):
+    return [{
+        "id": entity_id,
+        "name": name,
+        "num_upcoming_shows": num_upcoming_shows
+    } for entity_id, name, num_upcoming_shows, *_ in rows]
+
+
+class TrigramSearch:
+    """pg_trgm backed search, served by the GIN indexes of fdd82f190d8c."""
+
+    def genres_text(self, model):
+        # IMMUTABLE wrapper created by the migration, so the expression
+        # matches the index
+        return db.func.fyyur_genres_text(model.genres)
+
+    def search(self, model, term, limit, with_total=False):
+        fields = [model.name, model.city, model.state, self.genres_text(model)]
+        pattern = f'%{term}%'
+        # '%%' renders as pg_trgm's % operator once psycopg2 unescapes it
+        match = db.or_(*[field.op('%%')(term) for field in fields],
+                       *[field.ilike(pattern) for field in fields])
+        score = db.func.greatest(
+            *[db.func.similarity(field, term) for field in fields])
+
+        rows = upcoming_counts_query(model).add_columns(
+            score.label('score')
+        ).filter(match).order_by(
+            db.desc('score'), model.name, model.id).limit(limit).all()
+        data = search_result(rows)
+
+        return {
+            "count": model.query.filter(match).count() if with_total else len(data),
+            "data": data
+        }
+
+
+def trigrams(text):
+    # same extraction as pg_trgm: lower-cased alphanumeric words, each padded
+    # with two leading spaces and one trailing space
+    grams = set()
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class NgramIndex:
+    """In-memory trigram inverted index over the text fields of documents."""
+
+    def __init__(self, threshold=0.3):
+        self.threshold = threshold
+        self.postings = defaultdict(set)
+        self.documents = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, fields):
+        self.remove(doc_id)
+        document = [(text.lower(), trigrams(text)) for text in fields if text]
+        self.documents[doc_id] = document
+        for _, grams in document:
+            for gram in grams:
+                self.postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        for _, grams in self.documents.pop(doc_id, []):
+            for gram in grams:
+                self.postings[gram].discard(doc_id)
+                if not self.postings[gram]:
+                    del self.postings[gram]
+
+    def search(self, term):
+        needle = term.lower().strip()
+        query = trigrams(needle)
+        if len(needle) < 3:
+            # too short to share a trigram with a substring match
+            candidates = self.documents.keys()
+        else:
+            candidates = set()
+            for gram in query:
+                candidates |= self.postings.get(gram, set())
+
+        ranked = []
+        for doc_id in candidates:
+            score = 0.0
+            matched = False
+            for text, grams in self.documents[doc_id]:
+                field_score = similarity(query, grams)
+                score = max(score, field_score)
+                matched = matched or needle in text or field_score >= self.threshold
+            if matched:
+                ranked.append((doc_id, score))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+
+class NgramSearch:
+    """Pure Python fallback for databases without pg_trgm (e.g. SQLite).
+
+    One NgramIndex per model is built on first use and kept current by ORM
+    events, applied when this process's writes commit; writes from other
+    processes (workers, `flask import`) show up when it is rebuilt, every
+    SEARCH_REFRESH_SECONDS. The events and the request threads searching
+    the index take turns on a lock.
+    """
+
+    def __init__(self, threshold=0.3, refresh_seconds=300):
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        self.indexes = {}
+        self.built_at = {}
+        self.lock = threading.Lock()
+        for model in (Venue, Artist):
+            event.listen(model, 'after_insert', self.on_write)
+            event.listen(model, 'after_update', self.on_write)
+            event.listen(model, 'after_delete', self.on_delete)
+
+    @staticmethod
+    def document(entity):
+        return [entity.name, entity.city, entity.state,
+                ' '.join(entity.genres or [])]
+
+    def build(self, model):
+        index = NgramIndex(self.threshold)
+        rows = db.session.query(
+            model.id, model.name, model.city, model.state, model.genres)
+        for entity in rows:
+            index.add(entity.id, self.document(entity))
+        return index
+
+    def index(self, model):
+        now = time.monotonic()
+        if (model not in self.indexes
+                or now - self.built_at[model] >= self.refresh_seconds):
+            # claimed first, so concurrent requests keep using the old index
+            self.built_at[model] = now
+            index = self.build(model)
+            with self.lock:
+                self.indexes[model] = index
+        return self.indexes[model]
+
+    def on_write(self, mapper, connection, target):
+        after_commit(target, partial(
+            self.apply, mapper.class_, 'add', target.id, self.document(target)))
+
+    def on_delete(self, mapper, connection, target):
+        after_commit(target, partial(
+            self.apply, mapper.class_, 'remove', target.id))
+
+    def apply(self, model, method, *args):
+        index = self.indexes.get(model)
+        if index is not None:
+            with self.lock:
+                getattr(index, method)(*args)
+
+    def search(self, model, term, limit, with_total=False):
+        index = self.index(model)
+        with self.lock:
+            ranked = index.search(term)
+        ids = [doc_id for doc_id, _ in ranked[:limit]]
+        rows = {}
+        if ids:
+            query = upcoming_counts_query(model).filter(model.id.in_(ids))
+            rows = {row[0]: row for row in query}
+        # ids of rows deleted by other processes simply drop out here
+        data = search_result(rows[doc_id] for doc_id in ids if doc_id in rows)
+
+        return {
+            "count": len(ranked) if with_total else len(data),
+            "data": data
+        }
+
+
+def init_search(app):
+    backend = app.config.get('SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+        backend = 'trigram' if dialect == 'postgresql' else 'ngram'
+
+    if backend == 'trigram':
+        search = TrigramSearch()
+    elif backend == 'ngram':
+        search = NgramSearch(app.config.get('SEARCH_SIMILARITY_THRESHOLD', 0.3),
+                             app.config.get('SEARCH_REFRESH_SECONDS', 300))
+    else:
+        raise ValueError(f'unknown SEARCH_BACKEND: {backend!r}')
+
+    app.extensions['search'] = search
+    return search
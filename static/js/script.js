@@ -2,3 +2,54 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Name pickers: an input with data-autocomplete (the JSON endpoint) and
+// data-target (the id of the field to fill) suggests names as they are
+// typed, through its datalist, and copies the id of the one picked; the id
+// is cleared again as soon as the text stops matching a suggestion.
+window.initAutocomplete = function initAutocomplete(input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var target = document.getElementById(input.dataset.target);
+  var ids = {};
+  var timer = null;
+  var latest = 0;
+
+  function label(item) {
+    return item.name + ' (' + [item.city, item.state].filter(Boolean).join(', ') + ')';
+  }
+
+  function suggest() {
+    var request = ++latest;
+    var url = input.dataset.autocomplete + '?q=' + encodeURIComponent(input.value);
+    fetch(url, { credentials: 'same-origin' })
+      .then(function (response) { return response.json(); })
+      .then(function (body) {
+        // answers to earlier keystrokes can arrive late
+        if (request !== latest) return;
+        ids = {};
+        list.innerHTML = '';
+        body.data.forEach(function (item) {
+          var option = document.createElement('option');
+          option.value = label(item);
+          ids[option.value] = item.id;
+          list.appendChild(option);
+        });
+      });
+  }
+
+  input.addEventListener('input', function () {
+    if (ids.hasOwnProperty(input.value)) {
+      target.value = ids[input.value];
+      return;
+    }
+    // the text no longer names the picked entity
+    target.value = '';
+    clearTimeout(timer);
+    if (input.value.trim()) timer = setTimeout(suggest, 120);
+  });
+};
+
+document.addEventListener('DOMContentLoaded', function () {
+  Array.prototype.forEach.call(
+    document.querySelectorAll('input[data-autocomplete]'), window.initAutocomplete);
+});
@@ -0,0 +1,78 @@
+import os
+
+# the app reads its configuration on import: an in-memory SQLite database,
+# never the one DATABASE_URL points at
+os.environ['FLASK_ENV'] = 'testing'
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import pytest
+
+from app import app as fyyur_app
+from models import db, Venue, Artist, Show
+
+# the required columns, for the rows a test does not care about
+VENUE_DEFAULTS = {'city': 'San Francisco', 'state': 'CA',
+                  'address': '1015 Folsom Street', 'phone': '123-123-1234',
+                  'genres': ['Jazz']}
+ARTIST_DEFAULTS = {'city': 'San Francisco', 'state': 'CA',
+                   'genres': ['Rock n Roll']}
+
+
+@pytest.fixture
+def app():
+    # every test starts from an empty database: forget what the in-process
+    # indexes and caches hold
+    for name in ('search', 'autocomplete', 'facets'):
+        getattr(fyyur_app.extensions[name], 'indexes', {}).clear()
+    fyyur_app.extensions['cache'].clear()
+    with fyyur_app.app_context():
+        db.create_all()
+        yield fyyur_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def session(app):
+    return db.session
+
+
+@pytest.fixture
+def make_venue(session):
+    def make_venue(name, **columns):
+        venue = Venue(**dict(VENUE_DEFAULTS, name=name, **columns))
+        session.add(venue)
+        session.commit()
+        return venue
+    return make_venue
+
+
+@pytest.fixture
+def make_artist(session):
+    def make_artist(name, **columns):
+        artist = Artist(**dict(ARTIST_DEFAULTS, name=name, **columns))
+        session.add(artist)
+        session.commit()
+        return artist
+    return make_artist
+
+
+@pytest.fixture
+def venue(make_venue):
+    return make_venue('The Musical Hop')
+
+
+@pytest.fixture
+def artist(make_artist):
+    return make_artist('Guns N Petals')
+
+
+@pytest.fixture
+def book(session):
+    def book(venue, artist, start_time, duration_minutes):
+        show = Show(venue_id=venue.id, artist_id=artist.id,
+                    start_time=start_time, duration_minutes=duration_minutes)
+        session.add(show)
+        session.commit()
+        return show
+    return book
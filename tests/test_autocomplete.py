@@ -0,0 +1,133 @@
+from autocomplete import PrefixIndex, fold
+from models import Venue
+
+
+def complete(index, prefix, limit=10):
+    return [item['name'] for item in index.complete(prefix, limit)]
+
+
+#----------------------------------------------------------------------------#
+# PrefixIndex.
+#----------------------------------------------------------------------------#
+
+
+def test_fold():
+    assert fold('Café Zürich') == 'cafe zurich'
+    assert fold('Straße') == 'strasse'
+
+
+def test_names_first_then_later_words():
+    index = PrefixIndex()
+    index.add(1, 'Park Square Live Music & Coffee')
+    index.add(2, 'The Dueling Pianos Bar')
+    index.add(3, 'Live Oak')
+    index.add(4, 'Oakland Live')
+    assert complete(index, 'live') == ['Live Oak', 'Oakland Live',
+                                       'Park Square Live Music & Coffee']
+    assert complete(index, 'pia') == ['The Dueling Pianos Bar']
+    assert complete(index, 'live music') == ['Park Square Live Music & Coffee']
+
+
+def test_accents_case_and_spaces_are_ignored():
+    index = PrefixIndex()
+    index.add(1, 'Café  Zürich')
+    assert complete(index, 'CAFE') == ['Café  Zürich']
+    assert complete(index, '  zur') == ['Café  Zürich']
+    assert complete(index, 'cafe   zu') == ['Café  Zürich']
+
+
+def test_no_match_and_empty_prefix():
+    index = PrefixIndex()
+    index.add(1, 'The Musical Hop')
+    assert complete(index, 'jazz') == []
+    assert complete(index, '') == []
+    assert complete(index, '   ') == []
+
+
+def test_each_item_once():
+    index = PrefixIndex()
+    index.add(1, 'Hop Hop Hop')
+    assert [item['id'] for item in index.complete('hop')] == [1]
+
+
+def test_limit():
+    index = PrefixIndex()
+    for i in range(20):
+        index.add(i, f'Hall {i:02}')
+        index.add(100 + i, f'The Hall {i:02}')
+    assert complete(index, 'hall', limit=3) == ['Hall 00', 'Hall 01', 'Hall 02']
+    assert len(index.complete('hall', limit=30)) == 30
+
+
+def test_rename_and_remove():
+    index = PrefixIndex()
+    index.add(1, 'The Musical Hop', city='San Francisco')
+    index.add(1, 'Park Square', city='Oakland')
+    assert len(index) == 1
+    assert complete(index, 'hop') == []
+    assert complete(index, 'the') == []
+    assert index.complete('square') == [
+        {'id': 1, 'name': 'Park Square', 'city': 'Oakland'}]
+    index.remove(1)
+    index.remove(1)
+    assert len(index) == 0
+    assert complete(index, 'park') == []
+    assert index.names == index.words == []
+
+
+#----------------------------------------------------------------------------#
+# Endpoint.
+#----------------------------------------------------------------------------#
+
+
+def suggested(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [item['name'] for item in response.get_json()['data']]
+
+
+def test_endpoint(app, make_venue, make_artist):
+    make_venue('The Musical Hop')
+    make_venue('Hop Hall', city='Oakland')
+    make_artist('Hopkins')
+    client = app.test_client()
+    assert suggested(client, '/api/v1/venues/autocomplete?q=hop') == [
+        'Hop Hall', 'The Musical Hop']
+    assert suggested(client, '/api/v1/artists/autocomplete?q=HOP') == ['Hopkins']
+    assert client.get('/api/v1/venues/autocomplete?q=hop').get_json()['data'][0] == {
+        'id': 2, 'name': 'Hop Hall', 'city': 'Oakland', 'state': 'CA'}
+    assert suggested(client, '/api/v1/venues/autocomplete') == []
+
+
+def test_endpoint_limit_is_clamped(app, make_venue):
+    for i in range(30):
+        make_venue(f'Hall {i:02}')
+    client = app.test_client()
+    assert len(suggested(client, '/api/v1/venues/autocomplete?q=hall')) == \
+        app.config['AUTOCOMPLETE_LIMIT']
+    assert suggested(client, '/api/v1/venues/autocomplete?q=hall&limit=2') == [
+        'Hall 00', 'Hall 01']
+    assert len(suggested(client, '/api/v1/venues/autocomplete?q=hall&limit=0')) == 1
+    assert len(suggested(client, '/api/v1/venues/autocomplete?q=hall&limit=500')) == \
+        app.config['AUTOCOMPLETE_MAX_LIMIT']
+
+
+def test_endpoint_follows_renames_and_rollbacks(app, session, make_venue):
+    client = app.test_client()
+    venue = make_venue('The Musical Hop')
+    assert suggested(client, '/api/v1/venues/autocomplete?q=hop') == ['The Musical Hop']
+
+    venue.name = 'Park Square'
+    session.commit()
+    assert suggested(client, '/api/v1/venues/autocomplete?q=hop') == []
+    assert suggested(client, '/api/v1/venues/autocomplete?q=squ') == ['Park Square']
+
+    session.add(Venue(name='Hopper', city='Oakland', state='CA',
+                      address='1 Main St', phone='1', genres=['Jazz']))
+    session.flush()
+    session.rollback()
+    assert suggested(client, '/api/v1/venues/autocomplete?q=hop') == []
+
+    session.delete(venue)
+    session.commit()
+    assert suggested(client, '/api/v1/venues/autocomplete?q=park') == []
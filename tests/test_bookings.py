@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+from bookings import IntervalIndex, MAX_DURATION, check_batch, find_conflicts
+from models import Artist, SHOW_MAX_MINUTES
+
+START = datetime(2030, 5, 1, 20, 0)
+
+
+def hours(n):
+    return timedelta(hours=n)
+
+
+#----------------------------------------------------------------------------#
+# IntervalIndex.
+#----------------------------------------------------------------------------#
+
+
+def test_interval_index_back_to_back_does_not_overlap():
+    index = IntervalIndex(MAX_DURATION)
+    index.add(1, START - hours(2), START, 'before')
+    index.add(1, START + hours(2), START + hours(4), 'after')
+    assert index.overlapping(1, START, START + hours(2)) == []
+
+
+def test_interval_index_overlap():
+    index = IntervalIndex(MAX_DURATION)
+    index.add(1, START - hours(1), START + hours(1), 'a')
+    index.add(2, START, START + hours(2), 'other key')
+    assert index.overlapping(1, START, START + hours(2)) == [
+        (START - hours(1), START + hours(1), 'a')]
+
+
+def test_interval_index_window_edge():
+    index = IntervalIndex(MAX_DURATION)
+    # the longest interval there can be, ending where the query starts
+    index.add(1, START - MAX_DURATION, START, 'ends at start')
+    assert index.overlapping(1, START, START + hours(1)) == []
+
+    minute = timedelta(minutes=1)
+    index.add(1, START - MAX_DURATION + minute, START + minute, 'one minute over')
+    assert [ident for _, _, ident in index.overlapping(
+        1, START, START + hours(1))] == ['one minute over']
+
+
+#----------------------------------------------------------------------------#
+# find_conflicts.
+#----------------------------------------------------------------------------#
+
+
+def test_back_to_back_shows_do_not_conflict(venue, artist, book):
+    book(venue, artist, START - hours(2), 120)
+    book(venue, artist, START + hours(2), 60)
+    assert find_conflicts(venue.id, artist.id, START, 120) == []
+
+
+def test_overlapping_show_conflicts_at_venue_and_artist(venue, artist, book):
+    show = book(venue, artist, START - hours(1), 120)
+    conflicts = find_conflicts(venue.id, artist.id, START, 120)
+    assert sorted(conflict.kind for conflict in conflicts) == ['artist', 'venue']
+    assert {conflict.show_id for conflict in conflicts} == {show.id}
+    assert conflicts[0].end_time == START + hours(1)
+
+
+def test_longest_show_at_the_window_edge(venue, artist, book):
+    # starts SHOW_MAX_MINUTES before and ends exactly at the new start
+    book(venue, artist, START - MAX_DURATION, SHOW_MAX_MINUTES)
+    assert find_conflicts(venue.id, artist.id, START, 60) == []
+
+    # one minute later, it runs into the new show
+    book(venue, artist, START - MAX_DURATION + timedelta(minutes=1),
+         SHOW_MAX_MINUTES)
+    assert len(find_conflicts(venue.id, artist.id, START, 60)) == 2
+
+
+def test_conflicts_only_with_the_same_venue_or_artist(session, venue, artist, book):
+    other = Artist(name='Matt Quevedo', city='New York', state='NY',
+                   genres=['Jazz'])
+    session.add(other)
+    session.commit()
+    book(venue, other, START, 60)
+    conflicts = find_conflicts(venue.id, artist.id, START, 60)
+    assert [conflict.kind for conflict in conflicts] == ['venue']
+
+
+#----------------------------------------------------------------------------#
+# check_batch.
+#----------------------------------------------------------------------------#
+
+
+def row(venue, artist, start_time, duration_minutes=120):
+    return {'venue_id': venue.id, 'artist_id': artist.id,
+            'start_time': start_time, 'duration_minutes': duration_minutes}
+
+
+def test_check_batch_empty():
+    assert check_batch([]) == []
+
+
+def test_check_batch_against_booked_shows(venue, artist, book):
+    show = book(venue, artist, START, 120)
+    results = check_batch([row(venue, artist, START + hours(1)),
+                           row(venue, artist, START + hours(2))])
+    assert {conflict.show_id for conflict in results[0]} == {show.id}
+    assert results[1] == []
+
+
+def test_check_batch_rows_conflicting_with_each_other(venue, artist):
+    results = check_batch([
+        row(venue, artist, START),
+        row(venue, artist, START + hours(1)),
+        # overlaps only the second row, which is not booked
+        row(venue, artist, START + hours(2) + timedelta(minutes=30)),
+        row(venue, artist, START + hours(4)),
+    ], labels=['line 2', 'line 3', 'line 4', 'line 5'])
+    assert results[0] == []
+    assert {conflict.show_id for conflict in results[1]} == {'line 2'}
+    assert results[2] == []
+    # the third row was accepted, so the fourth overlaps it
+    assert {conflict.show_id for conflict in results[3]} == {'line 4'}
+
+
+def test_check_batch_default_labels(venue, artist):
+    results = check_batch([row(venue, artist, START),
+                           row(venue, artist, START)])
+    assert {conflict.show_id for conflict in results[1]} == {'row 1'}
@@ -0,0 +1,208 @@
+import random
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import facets
+from facets import FACETS, FacetBitmaps, parse_filters
+from models import Venue
+
+ENTITIES = [
+    # id, genres, city, state, seeking
+    (1, ['Jazz', 'Blues'], 'San Francisco', 'CA', True),
+    (2, ['Jazz'], 'Oakland', 'CA', False),
+    (3, ['Rock n Roll'], 'New York', 'NY', True),
+    (4, ['Jazz', 'Rock n Roll'], 'New York', 'NY', False),
+    (5, [], 'San Francisco', 'CA', False),
+]
+
+
+def bitmaps(entities=ENTITIES):
+    index = FacetBitmaps()
+    for entity in entities:
+        index.add(*entity)
+    return index
+
+
+def ids(index, bitmap):
+    return index.page(bitmap, limit=len(index.ids))
+
+
+def brute_force(entities, filters, match='any'):
+    # {facet: [(value, count)]} by checking every entity
+    def keeps(values, facet, skip):
+        selected = filters.get(facet)
+        if facet == skip or not selected:
+            return True
+        if facet == 'genre' and match == 'all':
+            return set(selected) <= values[facet]
+        return bool(set(selected) & values[facet])
+
+    counts = {}
+    for facet in FACETS:
+        tally = {}
+        for entity_id, *columns in entities:
+            values = FacetBitmaps.facet_values(*columns)
+            if all(keeps(values, other, facet) for other in FACETS):
+                for value in values[facet]:
+                    tally[value] = tally.get(value, 0) + 1
+        counts[facet] = FacetBitmaps.ranked(tally.items())
+    return counts
+
+
+#----------------------------------------------------------------------------#
+# parse_filters.
+#----------------------------------------------------------------------------#
+
+
+def test_parse_filters():
+    args = MultiDict([('genre', 'Jazz'), ('genre', 'Blues'), ('city', ''),
+                      ('state', 'CA'), ('seeking', 'true'), ('after', '3')])
+    assert parse_filters(args) == {'genre': ['Jazz', 'Blues'], 'city': [],
+                                   'state': ['CA'], 'seeking': [True]}
+
+
+def test_parse_filters_rejects_other_seeking_values():
+    with pytest.raises(ValueError):
+        parse_filters(MultiDict([('seeking', 'maybe')]))
+
+
+#----------------------------------------------------------------------------#
+# FacetBitmaps.
+#----------------------------------------------------------------------------#
+
+
+def test_select():
+    index = bitmaps()
+    assert ids(index, index.select({})) == [1, 2, 3, 4, 5]
+    assert ids(index, index.select({'genre': ['Jazz', 'Blues']})) == [1, 2, 4]
+    assert ids(index, index.select({'genre': ['Jazz', 'Rock n Roll']},
+                                   match='all')) == [4]
+    assert ids(index, index.select({'genre': ['Jazz'], 'state': ['CA'],
+                                    'seeking': [False]})) == [2]
+    assert ids(index, index.select({'genre': ['Jazz'], 'state': ['CA']},
+                                   skip='genre')) == [1, 2, 5]
+    assert ids(index, index.select({'city': ['Nowhere']})) == []
+
+
+def test_page():
+    index = bitmaps()
+    everything = index.select({})
+    assert index.page(everything, limit=2) == [1, 2]
+    assert index.page(everything, after=2, limit=2) == [3, 4]
+    assert index.page(everything, after=4, limit=2) == [5]
+    assert index.page(everything, after=5) == []
+    assert index.page(index.select({'state': ['NY']}), after=1) == [3, 4]
+
+
+def test_counts_over_the_whole_catalog():
+    index = bitmaps()
+    counts = index.counts({})
+    assert counts == brute_force(ENTITIES, {})
+    assert counts['genre'] == [('Jazz', 3), ('Rock n Roll', 2), ('Blues', 1)]
+    assert counts['seeking'] == [(False, 3), (True, 2)]
+    # kept until the next write
+    assert index.totals is not None
+    index.add(6, ['Blues'], 'Oakland', 'CA', True)
+    assert index.totals is None
+    assert index.counts({})['genre'] == [('Jazz', 3), ('Blues', 2),
+                                         ('Rock n Roll', 2)]
+
+
+def test_counts_ignore_their_own_facet():
+    index = bitmaps()
+    counts = index.counts({'city': ['New York']})
+    # ties in value order
+    assert counts['city'] == [('New York', 2), ('San Francisco', 2),
+                              ('Oakland', 1)]
+    assert counts['state'] == [('NY', 2)]
+
+
+@pytest.mark.parametrize('walk_ratio', [0, 10 ** 9])
+@pytest.mark.parametrize('filters, match', [
+    ({'genre': ['Jazz']}, 'any'),
+    ({'genre': ['Jazz', 'Rock n Roll']}, 'all'),
+    ({'state': ['CA'], 'seeking': [False]}, 'any'),
+    ({'city': ['Nowhere']}, 'any'),
+])
+def test_counts_by_and_and_by_tally(monkeypatch, walk_ratio, filters, match):
+    # 0 ANDs every value's bitmap, a huge ratio tallies entity by entity
+    monkeypatch.setattr(facets, 'WALK_RATIO', walk_ratio)
+    assert bitmaps().counts(filters, match) == brute_force(ENTITIES, filters, match)
+
+
+def test_counts_match_a_brute_force_count():
+    rng = random.Random(0)
+    genres = ['Jazz', 'Blues', 'Rock n Roll', 'Folk', 'Pop']
+    cities = [(f'City {i}', f'S{i % 4}') for i in range(40)]
+    entities = [(i, rng.sample(genres, rng.randint(0, 3)), *rng.choice(cities),
+                 rng.random() < 0.5) for i in range(1, 400)]
+    index = bitmaps(entities)
+    for _ in range(50):
+        filters = {'genre': rng.sample(genres, rng.randint(0, 2)),
+                   'city': [city for city, _ in rng.sample(cities, rng.randint(0, 2))],
+                   'state': rng.sample(['S0', 'S1', 'S2', 'S3'], rng.randint(0, 2)),
+                   'seeking': rng.sample([True, False], rng.randint(0, 1))}
+        match = rng.choice(['any', 'all'])
+        assert index.counts(filters, match) == brute_force(entities, filters, match)
+
+
+def test_limit():
+    assert bitmaps().counts({}, limit=1)['genre'] == [('Jazz', 3)]
+
+
+def test_remove_and_re_add():
+    index = bitmaps()
+    index.remove(3)
+    index.remove(3)
+    index.add(4, ['Folk'], 'Oakland', 'CA', True)
+    entities = [ENTITIES[0], ENTITIES[1], (4, ['Folk'], 'Oakland', 'CA', True),
+                ENTITIES[4]]
+    assert index.counts({}) == brute_force(entities, {})
+    assert ids(index, index.select({'genre': ['Jazz']})) == [1, 2]
+    assert 'Rock n Roll' not in index.bitmaps['genre']
+
+
+def test_out_of_order_ids_are_rebuilt():
+    index = bitmaps()
+    index.add(0, ['Jazz'], 'Oakland', 'CA', True)
+    assert index.unordered
+
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+
+def test_browse(app, session, make_venue):
+    make_venue('A', genres=['Jazz'])
+    make_venue('B', genres=['Jazz', 'Blues'], city='Oakland')
+    make_venue('C', genres=['Rock n Roll'])
+    browse = app.extensions['facets'].browse
+    results = browse(Venue, {'genre': ['Jazz']}, limit=1)
+    assert results['count'] == 2
+    assert [row['name'] for row in results['data']] == ['A']
+    assert results['facets']['city'] == [('Oakland', 1), ('San Francisco', 1)]
+
+
+def test_rolled_back_writes_are_not_counted(app, session, make_venue):
+    make_venue('A')
+    make_venue('B')
+    browse = app.extensions['facets'].browse
+    assert browse(Venue, {'genre': ['Jazz']})['count'] == 2
+
+    session.add(Venue(name='C', city='Los Angeles', state='CA', address='1',
+                      phone='1', genres=['Jazz']))
+    session.flush()
+    session.rollback()
+    results = browse(Venue, {'genre': ['Jazz']})
+    assert results['count'] == len(results['data']) == 2
+    assert results['facets']['city'] == [('San Francisco', 2)]
+
+
+def test_seeking_must_be_true_or_false(app, make_venue):
+    make_venue('A')
+    client = app.test_client()
+    assert client.get('/venues/browse?seeking=true').status_code == 200
+    assert client.get('/venues/browse?seeking=maybe').status_code == 400
+    assert client.get('/api/v1/venues/browse?seeking=maybe').status_code == 400
@@ -0,0 +1,38 @@
+import json
+import logging
+
+import instrumentation
+
+
+def logged(caplog):
+    return [(record.levelno, json.loads(record.getMessage()))
+            for record in caplog.records
+            if record.getMessage().startswith('{"event": "request_queries"')]
+
+
+def test_requests_are_logged_at_debug(app, caplog, venue):
+    caplog.set_level(logging.DEBUG, logger=app.logger.name)
+    assert app.test_client().get('/venues').status_code == 200
+    [(level, record)] = logged(caplog)
+    assert level == logging.DEBUG
+    assert record['endpoint'] == 'venues'
+    assert record['query_count'] >= 1
+
+
+class SlowClock:
+    # every statement seems to take a second
+    def __init__(self):
+        self.now = 0
+
+    def perf_counter(self):
+        self.now += 1
+        return self.now
+
+
+def test_slow_requests_are_logged_at_warning(app, caplog, venue, monkeypatch):
+    caplog.set_level(logging.DEBUG, logger=app.logger.name)
+    monkeypatch.setattr(instrumentation, 'time', SlowClock())
+    assert app.test_client().get('/venues').status_code == 200
+    [(level, record)] = logged(caplog)
+    assert level == logging.WARNING
+    assert record['slowest'][0]['ms'] >= 1000
@@ -0,0 +1,108 @@
+from base64 import urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Show, decode_cursor, encode_cursor
+
+START = datetime(2030, 5, 1, 20, 0)
+
+Row = namedtuple('Row', 'id start_time venue_id venue_name artist_id '
+                        'artist_name artist_image_link')
+
+
+def rows(ids):
+    return [Row(i, START + timedelta(hours=i), 1, 'Venue', 2, 'Artist', None)
+            for i in ids]
+
+
+#----------------------------------------------------------------------------#
+# Cursors.
+#----------------------------------------------------------------------------#
+
+
+def test_cursor_round_trip():
+    start_time = datetime(2030, 5, 1, 20, 30, 15, 250)
+    assert decode_cursor(encode_cursor(start_time, 42)) == (start_time, 42)
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not a cursor',
+    urlsafe_b64encode(b'2030-05-01T20:00:00').decode(),
+    urlsafe_b64encode(b'2030-05-01T20:00:00|x').decode(),
+    urlsafe_b64encode(b'yesterday|1').decode(),
+    urlsafe_b64encode(b'2030-05-01T20:00:00|1|2').decode(),
+    urlsafe_b64encode(b'\xff\xfe|1').decode(),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+#----------------------------------------------------------------------------#
+# Show.page_data.
+#----------------------------------------------------------------------------#
+
+
+def cursor_id(cursor):
+    return decode_cursor(cursor)[1]
+
+
+def test_first_page():
+    page = Show.page_data(rows([1, 2, 3, 4]), None, None, per_page=3)
+    assert [show['id'] for show in page['shows']] == [1, 2, 3]
+    assert cursor_id(page['next_cursor']) == 3
+    assert page['prev_cursor'] is None
+
+
+def test_last_page_after_a_cursor():
+    after = encode_cursor(START, 3)
+    page = Show.page_data(rows([4, 5]), after, None, per_page=3)
+    assert [show['id'] for show in page['shows']] == [4, 5]
+    assert page['next_cursor'] is None
+    assert cursor_id(page['prev_cursor']) == 4
+
+
+def test_page_before_a_cursor_is_put_back_in_order():
+    # queried newest first, one more row than the page: more pages before
+    before = encode_cursor(START + timedelta(hours=5), 5)
+    page = Show.page_data(rows([4, 3, 2, 1]), None, before, per_page=3)
+    assert [show['id'] for show in page['shows']] == [2, 3, 4]
+    assert cursor_id(page['next_cursor']) == 4
+    assert cursor_id(page['prev_cursor']) == 2
+
+
+def test_first_page_reached_backwards():
+    before = encode_cursor(START + timedelta(hours=3), 3)
+    page = Show.page_data(rows([2, 1]), None, before, per_page=3)
+    assert [show['id'] for show in page['shows']] == [1, 2]
+    assert cursor_id(page['next_cursor']) == 2
+    assert page['prev_cursor'] is None
+
+
+def test_empty_page():
+    page = Show.page_data([], None, None, per_page=3)
+    assert page == {"shows": [], "next_cursor": None, "prev_cursor": None}
+
+
+def test_get_page_walks_every_show(venue, artist, book):
+    # equal start times are ordered by id
+    for hour in (3, 1, 2, 2, 5, 4, 4):
+        book(venue, artist, START + timedelta(hours=hour), 30)
+    expected = [show.id for show in Show.query.order_by(Show.start_time, Show.id)]
+
+    seen, cursors, after = [], [], None
+    while True:
+        page = Show.get_page(after=after, per_page=3)
+        seen += [show['id'] for show in page['shows']]
+        cursors.append(page['prev_cursor'])
+        after = page['next_cursor']
+        if after is None:
+            break
+    assert seen == expected
+
+    # and back from the last page
+    back = Show.get_page(before=cursors[-1], per_page=3)
+    assert [show['id'] for show in back['shows']] == expected[3:6]
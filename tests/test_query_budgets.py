@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from models import db, Venue, Artist
+
+START = datetime(2030, 5, 1, 20, 0)
+
+
+def queries(app, url):
+    # statements one uncached request issues, from an empty session as in
+    # production; over its QUERY_BUDGETS entry the request fails
+    count = [0]
+
+    def counted(*args):
+        count[0] += 1
+
+    db.session.remove()
+    app.extensions['cache'].clear()
+    event.listen(db.engine, 'before_cursor_execute', counted)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', counted)
+    assert response.status_code == 200
+    return count[0]
+
+
+@pytest.mark.parametrize('endpoint, url', [
+    ('show_venue', '/venues/{venue}'),
+    ('show_artist', '/artists/{artist}'),
+    ('venues', '/venues'),
+    ('shows', '/shows'),
+])
+def test_query_count_does_not_grow_with_the_shows(app, make_venue, make_artist,
+                                                   book, endpoint, url):
+    assert app.testing
+    make_venue('The Musical Hop')
+    make_venue('Park Square', city='Oakland')
+    for i in range(10):
+        make_artist(f'Artist {i}')
+    url = url.format(venue=1, artist=1)
+
+    def catalog():
+        return Venue.query.order_by(Venue.id).all(), \
+            Artist.query.order_by(Artist.id).all()
+
+    # a past and an upcoming show
+    venues, artists = catalog()
+    book(venues[0], artists[0], datetime.today() - timedelta(days=1), 60)
+    book(venues[0], artists[1], START, 60)
+    few = queries(app, url)
+
+    # many more, at both venues, with every artist
+    venues, artists = catalog()
+    for i in range(40):
+        book(venues[i % 2], artists[i % 10], START + timedelta(days=i + 1), 60)
+        book(venues[0], artists[0], datetime.today() - timedelta(days=i + 2), 60)
+    assert queries(app, url) == few <= app.config['QUERY_BUDGETS'][endpoint]
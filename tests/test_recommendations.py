@@ -0,0 +1,191 @@
+from datetime import datetime
+
+import pytest
+
+from models import RecommendationStale
+from recommendations import (Catalog, recommended_artists, recommended_venues,
+                             refresh)
+
+SF = ('San Francisco', 'CA')
+OAKLAND = ('Oakland', 'CA')
+NEW_YORK = ('New York', 'NY')
+
+
+def catalog(venues, artists, bookings=()):
+    # rows as (id, genres, (city, state), seeking)
+    def rows(side):
+        return [(entity_id, genres, *place, seeking)
+                for entity_id, genres, place, seeking in side]
+    return Catalog(rows(venues), rows(artists), bookings)
+
+
+def score(cat, artist_id, venue_id):
+    return cat.score(cat.artists['positions'][artist_id],
+                     cat.venues['positions'][venue_id])
+
+
+def names(rows):
+    return [row['name'] for row in rows]
+
+
+#----------------------------------------------------------------------------#
+# Catalog.
+#----------------------------------------------------------------------------#
+
+
+def test_score():
+    cat = catalog(
+        venues=[(1, ['Jazz'], SF, True), (2, ['Folk'], NEW_YORK, False)],
+        artists=[(10, ['Jazz'], SF, True), (11, ['Jazz', 'Blues'], OAKLAND, False),
+                 (12, [], SF, False)])
+    # genre 1, same city, both seeking
+    assert score(cat, 10, 1) == pytest.approx(0.5 + 0.2 + 0.1)
+    # genre 1/2, same state, one seeking
+    assert score(cat, 11, 1) == pytest.approx(0.25 + 0.1 + 0.05)
+    assert score(cat, 12, 2) == 0
+    assert score(cat, 10, 2) == pytest.approx(0.05)
+
+
+def test_score_history():
+    # 10 and 11 played venue 2, so 11 is a peer of 10; venue 1 had 11 and 12
+    cat = catalog(
+        venues=[(1, [], NEW_YORK, False), (2, [], NEW_YORK, False)],
+        artists=[(10, [], SF, False), (11, [], SF, False), (12, [], SF, False),
+                 (13, [], SF, False)],
+        bookings=[(10, 2), (11, 2), (11, 1), (12, 1)])
+    # half of venue 1's artists are peers of 10
+    assert score(cat, 10, 1) == pytest.approx(0.2 * 1 / 2)
+    # 13 has played nowhere, so it has no peers
+    assert score(cat, 13, 1) == 0
+
+
+def test_weights():
+    cat = Catalog([(1, ['Jazz'], *SF, False)], [(10, ['Jazz'], *NEW_YORK, False)],
+                  (), weights={'genre': 1.0})
+    assert score(cat, 10, 1) == pytest.approx(1.0)
+
+
+def test_venues_for_skips_played_venues_and_breaks_ties_by_age():
+    cat = catalog(
+        venues=[(1, ['Jazz'], SF, True), (2, ['Jazz'], SF, True),
+                (3, ['Jazz'], SF, True), (4, ['Folk'], SF, True)],
+        artists=[(10, ['Jazz'], SF, True)],
+        bookings=[(10, 2)])
+    assert [venue_id for venue_id, _ in cat.venues_for(10, 10)] == [1, 3]
+    assert [venue_id for venue_id, _ in cat.venues_for(10, 1)] == [1]
+
+
+def test_artists_for_skips_played_artists_and_breaks_ties_by_age():
+    cat = catalog(
+        venues=[(1, ['Jazz'], SF, True)],
+        artists=[(10, ['Jazz'], SF, True), (11, ['Jazz'], SF, True),
+                 (12, ['Jazz'], SF, True), (13, ['Jazz'], NEW_YORK, True)],
+        bookings=[(11, 1)])
+    assert cat.artists_for(1, 10) == [
+        (10, pytest.approx(0.8)), (12, pytest.approx(0.8)),
+        (13, pytest.approx(0.6))]
+
+
+def test_candidates_through_the_co_booking_graph():
+    # no genre in common: 10 reaches venue 2 through its peer 11
+    cat = catalog(
+        venues=[(1, ['Folk'], SF, False), (2, ['Folk'], SF, False)],
+        artists=[(10, ['Jazz'], SF, False), (11, ['Jazz'], SF, False)],
+        bookings=[(10, 1), (11, 1), (11, 2)])
+    assert [venue_id for venue_id, _ in cat.venues_for(10, 10)] == [2]
+    assert [artist_id for artist_id, _ in cat.artists_for(2, 10)] == [10]
+
+
+#----------------------------------------------------------------------------#
+# Refresh.
+#----------------------------------------------------------------------------#
+
+
+def stale_marks(session):
+    return session.query(RecommendationStale).count()
+
+
+def test_full_refresh(session, make_venue, make_artist, book):
+    v0 = make_venue('V0', seeking_talent=True)
+    v1 = make_venue('V1', genres=['Folk'])
+    a1 = make_artist('A1', genres=['Jazz'], seeking_venue=True)
+    make_artist('A2', genres=['Jazz'], city='Oakland')
+    book(v1, a1, datetime(2030, 5, 1, 20), 60)
+    assert refresh(full=True) == (2, 2)
+    assert stale_marks(session) == 0
+    assert names(recommended_artists(v0.id)) == ['A1', 'A2']
+    assert names(recommended_venues(a1.id)) == ['V0']
+    # A2 shares no genre and no venue with V1's artists
+    assert names(recommended_artists(v1.id)) == []
+    assert names(recommended_artists(v0.id, limit=1)) == ['A1']
+
+
+def test_refresh_consumes_the_stale_marks(session, make_venue, make_artist):
+    v0 = make_venue('V0')
+    a1 = make_artist('A1', genres=['Jazz'])
+    assert stale_marks(session) == 2
+    assert refresh() == (1, 1)
+    assert stale_marks(session) == 0
+    assert names(recommended_artists(v0.id)) == ['A1']
+
+    # nothing stale, nothing recomputed
+    assert refresh() == (0, 0)
+
+    # an edit that leaves the profile alone marks nothing
+    a1.phone = '555-0100'
+    session.commit()
+    assert stale_marks(session) == 0
+    a1.city = 'Oakland'
+    session.commit()
+    assert stale_marks(session) == 1
+    refresh()
+    assert stale_marks(session) == 0
+
+
+def test_refresh_drops_pairs_once_booked(session, make_venue, make_artist, book):
+    v0 = make_venue('V0')
+    a1 = make_artist('A1', genres=['Jazz'])
+    refresh()
+    assert names(recommended_venues(a1.id)) == ['V0']
+    book(v0, a1, datetime(2030, 5, 1, 20), 60)
+    refresh()
+    assert names(recommended_venues(a1.id)) == []
+    assert names(recommended_artists(v0.id)) == []
+
+
+def test_new_artist_enters_the_lists_it_is_a_candidate_for(session, make_venue,
+                                                            make_artist):
+    v0 = make_venue('V0', seeking_talent=True)
+    make_artist('A1', genres=['Jazz'], seeking_venue=True)
+    make_artist('A2', genres=['Jazz'], seeking_venue=True)
+    refresh(full=True)
+    assert names(recommended_artists(v0.id)) == ['A1', 'A2']
+
+    # scores 0.8 for V0, as A1 and A2 do, and is named by no list yet
+    a3 = make_artist('A3', genres=['Jazz'], seeking_venue=True)
+    refresh()
+    assert names(recommended_artists(v0.id)) == ['A1', 'A2', 'A3']
+    assert names(recommended_venues(a3.id)) == ['V0']
+
+
+def test_artist_moving_into_a_venue_genre_enters_its_list(session, make_venue,
+                                                          make_artist):
+    v0 = make_venue('V0')
+    rock = make_artist('Rock')
+    refresh(full=True)
+    assert names(recommended_artists(v0.id)) == []
+
+    rock.genres = ['Jazz', 'Rock n Roll']
+    session.commit()
+    refresh()
+    assert names(recommended_artists(v0.id)) == ['Rock']
+
+
+def test_new_venue_enters_the_lists_it_is_a_candidate_for(session, make_venue,
+                                                          make_artist):
+    make_venue('V0')
+    a1 = make_artist('A1', genres=['Jazz'])
+    refresh(full=True)
+    make_venue('V1')
+    refresh()
+    assert names(recommended_venues(a1.id)) == ['V0', 'V1']
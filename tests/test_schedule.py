@@ -0,0 +1,85 @@
+from datetime import date
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from schedule import month_range, parse_range, preset_range
+
+# a Wednesday
+TODAY = date(2030, 5, 15)
+
+
+def parse(max_days=366, **args):
+    return parse_range(MultiDict(args), today=TODAY, max_days=max_days)
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('today', (date(2030, 5, 15), date(2030, 5, 16))),
+    ('tomorrow', (date(2030, 5, 16), date(2030, 5, 17))),
+    ('this-weekend', (date(2030, 5, 18), date(2030, 5, 20))),
+    ('this-week', (date(2030, 5, 13), date(2030, 5, 20))),
+    ('next-7-days', (date(2030, 5, 15), date(2030, 5, 22))),
+    ('this-month', (date(2030, 5, 1), date(2030, 6, 1))),
+])
+def test_presets(name, expected):
+    assert preset_range(name, TODAY) == expected
+
+
+def test_this_weekend_on_sunday():
+    assert preset_range('this-weekend', date(2030, 5, 19)) == (
+        date(2030, 5, 18), date(2030, 5, 20))
+
+
+def test_december():
+    assert month_range(2030, 12) == (date(2030, 12, 1), date(2031, 1, 1))
+
+
+def test_default_is_next_7_days():
+    assert parse() == (TODAY, date(2030, 5, 22))
+    assert parse(when='today') == (TODAY, date(2030, 5, 16))
+
+
+def test_month():
+    assert parse(month='2030-02') == (date(2030, 2, 1), date(2030, 3, 1))
+
+
+def test_from_to_is_inclusive():
+    assert parse(**{'from': '2030-06-01', 'to': '2030-06-03'}) == (
+        date(2030, 6, 1), date(2030, 6, 4))
+
+
+def test_from_alone_is_one_day():
+    assert parse(**{'from': '2030-06-01'}) == (date(2030, 6, 1), date(2030, 6, 2))
+
+
+def test_to_alone_starts_today():
+    assert parse(to='2030-05-20') == (TODAY, date(2030, 5, 21))
+
+
+def test_max_days():
+    assert parse(max_days=31, **{'from': '2030-06-01', 'to': '2030-07-01'}) == (
+        date(2030, 6, 1), date(2030, 7, 2))
+    with pytest.raises(ValueError):
+        parse(max_days=31, **{'from': '2030-06-01', 'to': '2030-07-02'})
+
+
+@pytest.mark.parametrize('args', [
+    {'when': 'someday'},
+    {'month': '2030'},
+    {'month': '2030-13'},
+    {'month': 'may'},
+    {'from': '2030-06-31'},
+    {'from': '2030-06-02', 'to': '2030-06-01'},
+    {'to': '9999-12-31'},
+    {'from': '9999-12-31'},
+])
+def test_invalid_ranges(args):
+    with pytest.raises(ValueError):
+        parse(max_days=10 ** 7, **args)
+
+
+def test_calendar_rejects_bad_ranges(app):
+    client = app.test_client()
+    assert client.get('/calendar?to=9999-12-31').status_code == 400
+    assert client.get('/calendar?month=2030-13').status_code == 400
+    assert client.get('/calendar?month=2030-05').status_code == 200
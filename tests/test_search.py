@@ -0,0 +1,72 @@
+from models import Venue
+from search import NgramIndex, trigrams
+
+
+def add_venue(session, name, city='San Francisco', genres=('Jazz',)):
+    venue = Venue(name=name, city=city, state='CA', address='1 Main St',
+                  phone='123-123-1234', genres=list(genres))
+    session.add(venue)
+    return venue
+
+
+def found(app, term):
+    results = app.extensions['search'].search(Venue, term, 10, with_total=True)
+    return results['count'], [row['name'] for row in results['data']]
+
+
+def test_trigrams_are_padded_words():
+    assert trigrams('Ab') == {'  a', ' ab', 'ab '}
+
+
+def test_ngram_index_ranks_by_similarity():
+    index = NgramIndex()
+    index.add(1, ['The Dueling Pianos Bar'])
+    index.add(2, ['Park Square Live Music & Coffee'])
+    index.add(3, ['Pianos'])
+    assert [doc_id for doc_id, _ in index.search('pianos')] == [3, 1]
+    index.remove(3)
+    assert [doc_id for doc_id, _ in index.search('pianos')] == [1]
+
+
+def test_committed_writes_are_searchable(app, session):
+    add_venue(session, 'Hop Hall')
+    session.commit()
+    assert found(app, 'hop') == (1, ['Hop Hall'])
+
+    venue = add_venue(session, 'Hopper')
+    session.commit()
+    assert found(app, 'hop')[0] == 2
+    venue.name = 'Jumper'
+    session.commit()
+    assert found(app, 'hop') == (1, ['Hop Hall'])
+    session.delete(venue)
+    session.commit()
+    assert found(app, 'jumper') == (0, [])
+
+
+def test_rolled_back_writes_are_not_searchable(app, session):
+    venue = add_venue(session, 'Hop Hall')
+    session.commit()
+    assert found(app, 'hop') == (1, ['Hop Hall'])
+
+    add_venue(session, 'Hopper')
+    session.flush()
+    session.rollback()
+    assert found(app, 'hop') == (1, ['Hop Hall'])
+
+    session.delete(venue)
+    session.flush()
+    session.rollback()
+    assert found(app, 'hop') == (1, ['Hop Hall'])
+
+
+def test_rebuilt_for_writes_made_elsewhere(app, session, monkeypatch):
+    assert found(app, 'hop') == (0, [])
+    # a Core insert, as `flask import` makes, fires no ORM event
+    session.execute(Venue.__table__.insert(), [{
+        'name': 'Hop Hall', 'city': 'San Francisco', 'state': 'CA',
+        'address': '1 Main St', 'phone': '1', 'genres': ['Jazz']}])
+    session.commit()
+    assert found(app, 'hop') == (0, [])
+    monkeypatch.setattr(app.extensions['search'], 'refresh_seconds', 0)
+    assert found(app, 'hop') == (1, ['Hop Hall'])